@@ -0,0 +1,89 @@
+import time
+import tkinter as tk
+
+
+class Tween:
+    def __init__(self, item, start, end, began, duration):
+        self.item = item
+        self.start = start
+        self.end = end
+        self.began = began
+        self.duration = duration
+
+    def coords_at(self, now):
+        t = min(1.0, (now - self.began) / self.duration) if self.duration > 0 else 1.0
+        return [a + (b - a) * t for a, b in zip(self.start, self.end)], t >= 1.0
+
+
+class Animator:
+    # One fixed-timestep loop for everything that moves on a canvas. Tweens
+    # are placed from the wall clock on every tick, so all sprites advance
+    # together and a late tick just lands further along instead of queueing
+    # up; at most one Tk timer is pending at any time.
+    def __init__(self, root, canvas, interval):
+        self.root = root
+        self.canvas = canvas
+        self.interval = interval  # ms
+        self.tweens = {}
+        self.events = []
+        self.frame_callbacks = []  # Run after every tick that moved something
+        self.timer = None
+
+    def now(self):
+        return time.perf_counter() * 1000
+
+    def move(self, item, dx, dy, duration):
+        # Slide an item by (dx, dy) pixels; a new slide of a moving item
+        # continues from where it is towards its old target plus the offset
+        now = self.now()
+        current = self.tweens.get(item)
+        if current is not None:
+            start, _ = current.coords_at(now)
+            end = current.end
+        else:
+            start = end = self.canvas.coords(item)
+        end = [v + (dx if i % 2 == 0 else dy) for i, v in enumerate(end)]
+        self.tweens[item] = Tween(item, start, end, now, duration)
+        self.start()
+
+    def schedule(self, delay, callback):
+        # Run callback from the loop once delay ms have passed, after that tick's tweens
+        self.events.append((self.now() + delay, callback))
+        self.start()
+
+    def start(self):
+        if self.timer is None:
+            self.timer = self.root.after(self.interval, self.tick)
+
+    def stop(self):
+        if self.timer is not None:
+            self.root.after_cancel(self.timer)
+            self.timer = None
+        self.tweens.clear()
+        self.events.clear()
+
+    def tick(self):
+        self.timer = None
+        began = self.now()
+        moved = bool(self.tweens)
+        try:
+            for item, tween in list(self.tweens.items()):
+                coords, done = tween.coords_at(began)
+                self.canvas.coords(item, *coords)
+                if done:
+                    del self.tweens[item]
+            if moved:
+                for callback in self.frame_callbacks:
+                    callback()
+        except tk.TclError:
+            self.stop()  # Canvas was destroyed, abort animation
+            return
+        due = [event for event in self.events if event[0] <= began]
+        if due:
+            self.events = [event for event in self.events if event[0] > began]
+            for _, callback in due:
+                callback()
+        if (self.tweens or self.events) and self.timer is None:
+            # Keep a fixed cadence: the next tick is due one interval after this one began
+            spent = self.now() - began
+            self.timer = self.root.after(max(1, int(self.interval - spent)), self.tick)
@@ -0,0 +1,111 @@
+import argparse
+import os
+import random
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+from engine import GameState, MOVES
+from levelgen import CALIBRATION, load_calibration, set_calibration
+
+MAX_STEPS = 200
+CHUNK_SIZE = 500
+
+
+def random_policy(state, rng):
+    return rng.choice('wasd')
+
+
+def greedy_policy(state, rng):
+    # Step towards the exit, never onto a known hazard; fall back to a random move
+    px, py = state.player_position
+    ex, ey = state.win_condition
+    best = []
+    best_dist = None
+    for command, (dx, dy) in MOVES.items():
+        nx, ny = px + dx, py + dy
+        if not (0 <= nx < state.grid_size and 0 <= ny < state.grid_size):
+            continue
+        if state.hazards.is_deadly(nx, ny):
+            continue
+        dist = abs(ex - nx) + abs(ey - ny)
+        if best_dist is None or dist < best_dist:
+            best, best_dist = [command], dist
+        elif dist == best_dist:
+            best.append(command)
+    if not best:
+        return random_policy(state, rng)
+    return rng.choice(best)
+
+
+POLICIES = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+}
+
+
+def run_episode(seed, level=1, policy="greedy", max_steps=MAX_STEPS):
+    return play_episode(GameState(level, seed), policy, random.Random(seed), max_steps)
+
+
+def play_episode(state, policy="greedy", rng=None, max_steps=MAX_STEPS):
+    choose = POLICIES[policy]
+    rng = rng or random.Random()
+    while state.running and state.moves < max_steps:
+        state.step(choose(state, rng))
+    return state.outcome, state.moves
+
+
+def _run_chunk(args):
+    seeds, level, policy, max_steps = args
+    outcomes = Counter()
+    moves = 0
+    for seed in seeds:
+        outcome, steps = run_episode(seed, level, policy, max_steps)
+        outcomes[outcome] += 1
+        moves += steps
+    return outcomes, moves
+
+
+def run_batch(episodes, level=1, policy="greedy", seed=0, processes=None, max_steps=MAX_STEPS, chunk_size=CHUNK_SIZE):
+    # Episode i uses seed + i, so any single episode can be replayed with run_episode
+    chunks = [
+        (range(start, min(start + chunk_size, seed + episodes)), level, policy, max_steps)
+        for start in range(seed, seed + episodes, chunk_size)
+    ]
+    outcomes = Counter()
+    moves = 0
+    if processes == 1:
+        for chunk_outcomes, chunk_moves in map(_run_chunk, chunks):
+            outcomes.update(chunk_outcomes)
+            moves += chunk_moves
+    else:
+        with Pool(processes, set_calibration, (dict(CALIBRATION),)) as pool:
+            for chunk_outcomes, chunk_moves in pool.imap_unordered(_run_chunk, chunks):
+                outcomes.update(chunk_outcomes)
+                moves += chunk_moves
+    return outcomes, moves
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play seeded Escape from Duck episodes headless.")
+    parser.add_argument("-n", "--episodes", type=int, default=10000)
+    parser.add_argument("-l", "--level", type=int, default=1)
+    parser.add_argument("-p", "--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-j", "--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--max-steps", type=int, default=MAX_STEPS)
+    args = parser.parse_args()
+    load_calibration()  # Play the levels the game plays
+
+    start = time.perf_counter()
+    outcomes, moves = run_batch(args.episodes, args.level, args.policy, args.seed, args.processes, args.max_steps)
+    elapsed = time.perf_counter() - start
+    print(f"{args.episodes} episodes at level {args.level} ({args.policy}) in {elapsed:.2f}s "
+          f"- {args.episodes / elapsed:.0f} episodes/s, {moves / elapsed:.0f} steps/s")
+    for outcome, count in outcomes.most_common():
+        print(f"  {outcome:8} {count:7}  {100 * count / args.episodes:5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
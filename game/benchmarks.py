@@ -0,0 +1,342 @@
+import argparse
+import json
+import random
+import sys
+import time
+from collections import Counter, deque
+from types import SimpleNamespace
+
+from animation import Animator
+from camera import Camera
+from engine import GameState, RUNNING
+from levelgen import DIRECTIONS, generate_level, grid_size_for_level
+from renderer import BoardRenderer
+from theme import CELL_SIZE
+
+PATHFINDING_SIZES = [6, 50, 200, 1000]
+LEGACY_MAX_SIZE = 200
+SWARM_SIZE = 100
+SWARM_DUCKS = 100
+GENERATION_SIZES = [6, 25, 50, 100, 200, 500]
+STATUS_SIZES = [6, 50, 200]
+TURRET_COUNTS = [2, 20, 200]
+RENDER_SIZES = [6, 15, 50, 200, 1000]
+REGRESSION_THRESHOLD = 0.25  # Flag metrics more than 25% slower than the baseline
+
+
+class RecordingCanvas:
+    # Stands in for tk.Canvas on displayless machines: keeps item coords and
+    # tags and counts every call, so renderer cost can be timed and compared
+    def __init__(self):
+        self.items = {}
+        self.next_id = 0
+        self.calls = Counter()
+
+    def create(self, *coords, **options):
+        self.calls["create"] += 1
+        self.next_id += 1
+        tags = options.get("tags", ())
+        self.items[self.next_id] = [list(coords), (tags,) if isinstance(tags, str) else tuple(tags)]
+        return self.next_id
+
+    create_rectangle = create_oval = create_polygon = create_line = create
+
+    def delete(self, tag):
+        self.calls["delete"] += 1
+        if tag == "all":
+            self.items.clear()
+        else:
+            for item in [i for i, (_, tags) in self.items.items() if tag == i or tag in tags]:
+                del self.items[item]
+
+    def coords(self, item, *coords):
+        self.calls["coords"] += 1
+        if coords:
+            self.items[item][0] = list(coords)
+        return self.items[item][0]
+
+    def move(self, item, dx, dy):
+        self.calls["move"] += 1
+        coords = self.items[item][0]
+        self.items[item][0] = [v + (dx if i % 2 == 0 else dy) for i, v in enumerate(coords)]
+
+    def itemconfig(self, item, **options):
+        self.calls["itemconfig"] += 1
+
+    def configure(self, **options):
+        self.calls["configure"] += 1
+
+    def tag_lower(self, tag):
+        self.calls["tag_lower"] += 1
+
+    def tag_raise(self, tag):
+        self.calls["tag_raise"] += 1
+
+    def xview_moveto(self, fraction):
+        self.calls["scroll"] += 1
+
+    yview_moveto = xview_moveto
+
+
+def legacy_duck_move(state):
+    # The original per-move BFS that carried a copied path on every queue entry
+    px, py = state.player_position
+    dx, dy = state.duck_position
+    grid = [[True for _ in range(state.grid_size)] for _ in range(state.grid_size)]
+    for sx, sy in state.spikes:
+        grid[sx][sy] = False
+    for (tx, ty), _ in state.turrets:
+        grid[tx][ty] = False
+    visited = [[False for _ in range(state.grid_size)] for _ in range(state.grid_size)]
+    queue = deque()
+    queue.append((dx, dy, []))
+    visited[dx][dy] = True
+    while queue:
+        x, y, path = queue.popleft()
+        if (x, y) == (px, py):
+            if path:
+                return path[0][0] - dx, path[0][1] - dy
+            return 0, 0
+        for mx, my in [(-1,0),(1,0),(0,-1),(0,1)]:
+            nx, ny = x + mx, y + my
+            if 0 <= nx < state.grid_size and 0 <= ny < state.grid_size:
+                if not visited[nx][ny] and grid[nx][ny]:
+                    visited[nx][ny] = True
+                    queue.append((nx, ny, path + [(nx, ny)]))
+    return 0, 0
+
+
+def bench_level(size, seed=0, spike_density=0.05, turret_density=0.01, extra_ducks=0, turret_count=None):
+    # Player and duck start in opposite corners so every move searches most of
+    # the grid; extra ducks are scattered over the free cells
+    rng = random.Random(seed)
+    cells = size * size
+    free = {(x, y) for x in range(size) for y in range(size)} - {(0, 0), (size - 1, size - 1), (size - 1, 0)}
+    if turret_count is None:
+        turret_count = int(cells * turret_density)
+    count = min(len(free) - extra_ducks, int(cells * spike_density) + turret_count)
+    layout = rng.sample(sorted(free), count + extra_ducks)
+    ducks, layout = layout[count:], layout[:count]
+    turrets = [(pos, rng.choice(DIRECTIONS)) for pos in layout[:turret_count]]
+    spikes = layout[turret_count:]
+    return GameState.from_layout(
+        size, (0, 0), (size - 1, size - 1), (size - 1, 0), spikes, turrets, extra_ducks=ducks, seed=seed
+    )
+
+
+def mean_time(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def time_duck_moves(size, moves, duck_move):
+    state = bench_level(size)
+    rng = random.Random(size)
+    elapsed = 0.0
+    for _ in range(moves):
+        state.move_player(rng.choice('wasd'))
+        start = time.perf_counter()
+        duck_move(state)
+        elapsed += time.perf_counter() - start
+    return elapsed / moves
+
+
+def bench_generation(quick=False):
+    # Stock object counts for each size, and the same size at level-10 counts
+    print("Level generation (sample, validate, repair), mean per level")
+    results = {}
+    for size in GENERATION_SIZES[:4] if quick else GENERATION_SIZES:
+        level = 3 * (size - grid_size_for_level(1)) + 1
+        repeat = 20 if size >= 200 else 200
+        rng = random.Random(size)
+        stock = mean_time(lambda: generate_level(level, rng, size), repeat)
+        sparse = mean_time(lambda: generate_level(10, rng, size), repeat)
+        results[f"grid={size} level={level}"] = stock
+        results[f"grid={size} level=10"] = sparse
+        print(f"  {size:>4}x{size:<4} level {level:<5} {stock * 1e3:8.3f} ms   level 10 counts {sparse * 1e3:8.3f} ms")
+    return results
+
+
+def bench_pathfinding(quick=False, moves=20, legacy_max_size=LEGACY_MAX_SIZE):
+    print("Duck pathfinding, mean cost per player move")
+    print(f"{'grid':>6} {'distance field':>16} {'legacy BFS':>14} {'speedup':>9}")
+    results = {}
+    for size in PATHFINDING_SIZES[:3] if quick else PATHFINDING_SIZES:
+        field = time_duck_moves(size, moves, GameState.smart_duck_move)
+        legacy = time_duck_moves(size, moves, legacy_duck_move) if size <= legacy_max_size else None
+        results[f"grid={size} field"] = field
+        legacy_text = f"{legacy * 1e3:11.3f} ms" if legacy is not None else f"{'skipped':>14}"
+        speedup = f"{legacy / field:8.1f}x" if legacy is not None else ""
+        print(f"{size:>6} {field * 1e3:13.3f} ms {legacy_text} {speedup}")
+    return results
+
+
+def bench_status(quick=False, checks=2000):
+    # check_status on random cells, reset after every check, across turret counts
+    print("Status checks, mean per check")
+    results = {}
+    for size in STATUS_SIZES:
+        for turrets in TURRET_COUNTS:
+            state = bench_level(size, turret_count=min(turrets, size * size // 4))
+            rng = random.Random(size)
+            cells = [
+                [x, y] for x, y in ((rng.randrange(size), rng.randrange(size)) for _ in range(checks))
+                if (x, y) not in state.turret_bases
+            ]
+
+            def check():
+                for cell in cells:
+                    state.player_position = cell
+                    state.outcome = RUNNING
+                    state.check_status()
+            per_check = mean_time(check, 1) / len(cells)
+            results[f"grid={size} turrets={turrets}"] = per_check
+            print(f"  {size:>4}x{size:<4} {turrets:>4} turrets {per_check * 1e6:8.3f} us")
+    return results
+
+
+def bench_rendering(quick=False, moves=50):
+    # Level build, then each move as the game animates it: the sprites slide
+    # through the Animator and every frame runs Game.follow_player (camera
+    # follow + culling), all on a stub canvas and a simulated clock
+    from escapefd import FRAME_INTERVAL, MOVE_DURATION, Game
+    print("Rendering on a recording canvas")
+    results = {}
+    for size in RENDER_SIZES[:3] if quick else RENDER_SIZES:
+        state = bench_level(size)
+        canvas = RecordingCanvas()
+        camera = Camera(canvas, size)
+        renderer = BoardRenderer(canvas)
+
+        def build():
+            camera.center_on(*renderer.sprite_coords(*state.player_position)[:2])
+            renderer.build(state, camera.visible_cells())
+        build_time = mean_time(build, 5)
+        items = len(canvas.items)
+        clock = [0.0]
+        animator = Animator(SimpleNamespace(after=lambda delay, callback: 1), canvas, FRAME_INTERVAL)
+        animator.now = lambda: clock[0]
+        game = SimpleNamespace(camera=camera, renderer=renderer, player=renderer.player)
+        animator.frame_callbacks.append(lambda: Game.follow_player(game))
+        rng = random.Random(size)
+        canvas.calls.clear()
+        frame = 0.0
+        frames = 0
+        for _ in range(moves):
+            # Only the render work is timed; a step on a big grid is mostly duck pathfinding
+            result = state.step(rng.choice('wasd'))
+            state.outcome = RUNNING
+            start = time.perf_counter()
+            shapes = [(renderer.player, result.player_move)] + list(zip(renderer.ducks, result.duck_moves))
+            for shape, (dx, dy) in shapes:
+                if dx or dy:
+                    animator.move(shape, dx * CELL_SIZE, dy * CELL_SIZE, MOVE_DURATION)
+            while animator.tweens:
+                clock[0] += FRAME_INTERVAL
+                animator.tick()
+                frames += 1
+            frame += time.perf_counter() - start
+        frame /= moves
+        results[f"grid={size} build"] = build_time
+        results[f"grid={size} move"] = frame
+        print(f"  {size:>4}x{size:<4} build {build_time * 1e3:8.3f} ms ({items} items)"
+              f"   move {frame * 1e3:7.3f} ms ({frames / moves:.0f} frames,"
+              f" {sum(canvas.calls.values()) / moves:.0f} canvas calls)")
+    results.update(bench_menu())
+    return results
+
+
+def bench_menu(frames=500):
+    # One main menu animation frame, driven through the Game methods
+    from escapefd import Game
+    menu = SimpleNamespace(
+        root=SimpleNamespace(after=lambda delay, callback: None),
+        menu_canvas=RecordingCanvas(),
+        main_menu_animating=True,
+    )
+    menu.animate_main_menu = lambda: Game.animate_main_menu(menu)
+    Game.main_menu_sprites(menu)
+    menu.menu_canvas.calls.clear()
+    per_frame = mean_time(lambda: Game.animate_main_menu(menu), frames)
+    calls = sum(menu.menu_canvas.calls.values()) / frames
+    print(f"  main menu frame {per_frame * 1e6:8.3f} us ({len(menu.menu_canvas.items)} items, {calls:.0f} canvas calls)")
+    return {"menu frame": per_frame}
+
+
+def bench_swarm(quick=False, size=SWARM_SIZE, ducks=SWARM_DUCKS, moves=20, legacy_moves=3):
+    # One shared distance field for the whole swarm against one legacy BFS per duck
+    print(f"Duck swarm, {ducks} ducks on a {size}x{size} grid, mean cost per player move")
+    state = bench_level(size, extra_ducks=ducks - 1)
+    rng = random.Random(size)
+
+    def shared_move():
+        state.move_player(rng.choice('wasd'))
+        state.move_ducks()
+    shared = mean_time(shared_move, moves)
+    print(f"  shared field {shared * 1e3:9.3f} ms  ({1 / shared:6.0f} moves/s)")
+    if quick:
+        return {"shared field": shared}
+
+    state = bench_level(size, extra_ducks=ducks - 1)
+
+    def legacy_move():
+        state.move_player(rng.choice('wasd'))
+        for duck in state.ducks:
+            state.duck_position = duck
+            legacy_duck_move(state)
+    legacy = mean_time(legacy_move, legacy_moves)
+    print(f"  BFS per duck {legacy * 1e3:9.3f} ms  ({legacy / shared:.0f}x slower)")
+    return {"shared field": shared}
+
+
+BENCHMARKS = {
+    "generation": bench_generation,
+    "pathfinding": bench_pathfinding,
+    "status": bench_status,
+    "rendering": bench_rendering,
+    "swarm": bench_swarm,
+}
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    # Metrics slower than the baseline by more than threshold, as (name, old, new)
+    regressions = []
+    for bench, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(bench, {}).get(metric)
+            if old and value > old * (1 + threshold):
+                regressions.append((f"{bench}: {metric}", old, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Escape from Duck hot path benchmarks.")
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark", help=f"any of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="skip the largest grid sizes")
+    parser.add_argument("-o", "--output", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="flag regressions against a saved JSON run")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+    results = {}
+    for name in args.benchmarks or BENCHMARKS:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name!r}")
+        results[name] = BENCHMARKS[name](quick=args.quick)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for metric, old, new in regressions:
+            print(f"REGRESSION {metric}: {old * 1e3:.3f} ms -> {new * 1e3:.3f} ms ({new / old - 1:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import random
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+from batch import MAX_STEPS, POLICIES, play_episode
+from engine import GameState, ESCAPED, RUNNING
+from levelgen import (
+    BASE_GRID_SIZE, CALIBRATION_FILE, CALIBRATION_VERSION,
+    formula_counts, formula_grid_size, generate_level,
+)
+from solver import parse_levels
+
+EPISODES = 1000  # Seeded games per candidate
+CHUNK_SIZE = 250
+GRID_OFFSETS = [-2, -1, 0, 1, 2]  # Candidates around the stock formulas
+SPIKE_FACTORS = [0.5, 0.75, 1.0, 1.25, 1.5, 2.0]
+TURRET_FACTORS = [0.5, 1.0, 1.5, 2.0]
+
+# Target escape rate: TARGET_START at level 1, TARGET_DROP less per level, never below TARGET_FLOOR
+TARGET_START = 0.65
+TARGET_DROP = 0.015
+TARGET_FLOOR = 0.35
+
+
+def target_escape_rate(level):
+    return max(TARGET_FLOOR, TARGET_START - TARGET_DROP * (level - 1))
+
+
+def candidates(level):
+    # (grid size, spikes, turrets) to try: grids a little smaller or bigger
+    # than the stock one (never below level 1's), each with scaled object counts
+    found = set()
+    for offset in GRID_OFFSETS:
+        grid_size = max(BASE_GRID_SIZE, formula_grid_size(level) + offset)
+        spikes, turrets = formula_counts(level, grid_size)
+        room = grid_size * grid_size - 5
+        for sf in SPIKE_FACTORS:
+            for tf in TURRET_FACTORS:
+                s = min(room, round(spikes * sf))
+                t = min(room - s, round(turrets * tf))
+                found.add((grid_size, s, t))
+    return sorted(found)
+
+
+def _run_trials(args):
+    # One chunk of seeded games of one candidate
+    level, params, seeds, policy, max_steps = args
+    grid_size, spikes, turrets = params
+    outcomes = Counter()
+    for seed in seeds:
+        layout = generate_level(level, random.Random(seed), grid_size, spikes, turrets)
+        state = GameState.from_layout(
+            layout.grid_size, layout.player, layout.duck, layout.exit,
+            layout.spikes, layout.turrets, level, layout.extra_ducks
+        )
+        outcome, _ = play_episode(state, policy, random.Random(seed), max_steps)
+        outcomes[outcome] += 1
+    return level, params, outcomes
+
+
+def calibrate(levels, episodes=EPISODES, policy="greedy", seed=0, processes=None, max_steps=MAX_STEPS):
+    # Returns {level: {params: Counter of outcomes}}. Every candidate plays the
+    # same seeds, so the candidates of a level differ only in their grid and counts
+    tasks = [
+        (level, params, range(start, min(start + CHUNK_SIZE, seed + episodes)), policy, max_steps)
+        for level in levels
+        for params in candidates(level)
+        for start in range(seed, seed + episodes, CHUNK_SIZE)
+    ]
+    results = {level: {} for level in levels}
+    with Pool(processes) as pool:
+        for level, params, outcomes in pool.imap_unordered(_run_trials, tasks):
+            results[level].setdefault(params, Counter()).update(outcomes)
+    return results
+
+
+def rates(outcomes):
+    total = sum(outcomes.values())
+    escaped = outcomes[ESCAPED] / total
+    # Survivors escaped or were still alive when the step limit ran out
+    return escaped, escaped + outcomes[RUNNING] / total
+
+
+def choose(level, trials):
+    # The candidate nearest the target, then the one nearest the stock grid and counts
+    target = target_escape_rate(level)
+    grid_size = formula_grid_size(level)
+    stock = formula_counts(level, grid_size)
+
+    def key(params):
+        escaped, _ = rates(trials[params])
+        return (
+            abs(escaped - target), abs(params[0] - grid_size),
+            abs(params[1] - stock[0]) + abs(params[2] - stock[1]),
+        )
+    return min(trials, key=key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure win rates per level and write the difficulty cache.")
+    parser.add_argument("levels", nargs="?", default="1-19", help="level or range, e.g. 1-19")
+    parser.add_argument("-n", "--episodes", type=int, default=EPISODES, help="games per candidate")
+    parser.add_argument("-p", "--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-j", "--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--max-steps", type=int, default=MAX_STEPS)
+    parser.add_argument("-o", "--output", default=CALIBRATION_FILE)
+    args = parser.parse_args()
+
+    levels = parse_levels(args.levels)
+    start = time.perf_counter()
+    results = calibrate(levels, args.episodes, args.policy, args.seed, args.processes, args.max_steps)
+    cache = {
+        "version": CALIBRATION_VERSION,
+        "policy": args.policy,
+        "episodes": args.episodes,
+        "levels": {},
+    }
+    print(f"{'level':>5} {'target':>6} {'stock':>6} {'chosen':>6} {'survival':>8}  grid spikes turrets")
+    for level, trials in results.items():
+        grid_size = formula_grid_size(level)
+        stock = (grid_size, *formula_counts(level, grid_size))
+        params = choose(level, trials)
+        escaped, survived = rates(trials[params])
+        cache["levels"][str(level)] = {
+            "grid_size": params[0], "spikes": params[1], "turrets": params[2],
+            "escape_rate": escaped, "survival_rate": survived, "target": target_escape_rate(level),
+        }
+        print(f"{level:>5} {target_escape_rate(level):6.2f} {rates(trials[stock])[0]:6.2f} {escaped:6.2f} "
+              f"{survived:8.2f}  {params[0]:>4} {params[1]:>6} {params[2]:>7}")
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+    print(f"Wrote {args.output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import math
+
+from theme import CELL_SIZE
+
+VIEW_CELLS = 12  # Widest view in cells; bigger grids scroll
+
+
+class Camera:
+    # Scrolls the canvas over a world of grid_size cells so that a followed
+    # item stays centred, clamped to the grid edges
+    def __init__(self, canvas, grid_size, view_cells=VIEW_CELLS, cell_size=CELL_SIZE):
+        self.canvas = canvas
+        self.grid_size = grid_size
+        self.cell_size = cell_size
+        self.view_cells = min(grid_size, view_cells)
+        self.span = self.view_cells * cell_size
+        self.world = grid_size * cell_size
+        self.left = 0
+        self.top = 0
+        canvas.configure(scrollregion=(0, 0, self.world, self.world))
+        canvas.xview_moveto(0)  # The canvas may be reused from a previous level
+        canvas.yview_moveto(0)
+
+    def center_on(self, x, y):
+        # x, y in world pixels
+        left = int(min(max(x - self.span / 2, 0), self.world - self.span))
+        top = int(min(max(y - self.span / 2, 0), self.world - self.span))
+        if left != self.left:
+            self.left = left
+            self.canvas.xview_moveto(left / self.world)
+        if top != self.top:
+            self.top = top
+            self.canvas.yview_moveto(top / self.world)
+
+    def follow(self, item):
+        x0, y0, x1, y1 = self.canvas.coords(item)
+        self.center_on((x0 + x1) / 2, (y0 + y1) / 2)
+
+    def visible_cells(self):
+        c = self.cell_size
+        return (
+            self.left // c, self.top // c,
+            min(self.grid_size, math.ceil((self.left + self.span) / c)),
+            min(self.grid_size, math.ceil((self.top + self.span) / c)),
+        )
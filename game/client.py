@@ -0,0 +1,117 @@
+import socket
+
+from engine import GameState, StepResult, SPIKES, TURRET, DUCK
+from levelpack import decode_entry
+from protocol import (
+    CLOSE, ERROR, FRAME, HOST, MOVE, NEW, PORT, START, TICK,
+    MOVE_COMMAND, NEW_SESSION, NO_SEED, SESSION, decode_tick, frame,
+)
+from replay import CODES
+
+TIMEOUT = 5.0  # s without a reply before a move fails
+
+
+class ServerError(Exception):
+    pass
+
+
+class Client:
+    # Blocking connection for the Tk game: one session at a time, each move
+    # waits for the tick that applies it (one tick interval at most). Every
+    # socket call gives up after `timeout`, so a stalled server raises
+    # TimeoutError instead of freezing the caller; after any error the
+    # stream may stop mid-message and the connection must be closed.
+    def __init__(self, host=HOST, port=PORT, timeout=TIMEOUT):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.settimeout(timeout)  # Reads too, not only the connect
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile("rb")
+        self.states = {}
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def send(self, kind, payload=b""):
+        self.sock.sendall(frame(kind, payload))
+
+    def receive(self):
+        # Read one message and apply it; returns the state a START created
+        header = self.file.read(FRAME.size)
+        if len(header) < FRAME.size:
+            raise ConnectionError("server closed the connection")
+        length, kind = FRAME.unpack(header)
+        payload = self.file.read(length)
+        if kind == START:
+            session_id = SESSION.unpack_from(payload)[0]
+            level, seed, _, layout, _ = decode_entry(payload, SESSION.size)
+            state = RemoteState(self, session_id, level, seed, layout)
+            self.states[session_id] = state
+            return state
+        if kind == TICK:
+            for diff in decode_tick(payload)[1]:
+                state = self.states.get(diff.session)
+                if state:
+                    state.apply(diff)
+        elif kind == ERROR:
+            raise ServerError(payload.decode(errors="replace"))
+        return None
+
+    def new_session(self, level, seed=None):
+        # Only the latest level is played, so earlier sessions are ended
+        for session_id in self.states:
+            self.send(CLOSE, SESSION.pack(session_id))
+        self.states.clear()
+        self.send(NEW, NEW_SESSION.pack(level, NO_SEED if seed is None else seed))
+        while True:
+            state = self.receive()
+            if state:
+                return state
+
+
+class RemoteState:
+    # Stands in for a GameState whose moves run on the server. A local
+    # GameState built from the START layout mirrors it for the renderer:
+    # step() sends the move and copies the diff that comes back into the
+    # mirror, patching turrets, the player and the ducks in place so the
+    # renderer's references stay valid. Everything else reads the mirror.
+    def __init__(self, client, session_id, level, seed, layout):
+        self.client = client
+        self.session_id = session_id
+        self.mirror = GameState.from_layout(
+            layout.grid_size, layout.player, layout.duck, layout.exit,
+            layout.spikes, layout.turrets, level, layout.extra_ducks, seed
+        )
+        self.result = None
+
+    def __getattr__(self, name):
+        return getattr(self.mirror, name)
+
+    def step(self, command):
+        if not self.mirror.running:
+            return self.mirror.step(command)
+        self.result = None
+        self.client.send(MOVE, MOVE_COMMAND.pack(self.session_id, CODES[command]))
+        while self.result is None:
+            self.client.receive()
+        return self.result
+
+    def apply(self, diff):
+        mirror = self.mirror
+        destroyed = None
+        for x, y in diff.destroyed:
+            destroyed = mirror.destroy_turret(x, y) or destroyed
+        player = mirror.player_position
+        player_move = (diff.player[0] - player[0], diff.player[1] - player[1])
+        player[:] = diff.player
+        duck_moves = []
+        for duck, (x, y) in zip(mirror.ducks, diff.ducks):
+            duck_moves.append((x - duck[0], y - duck[1]))
+            duck[:] = x, y
+        mirror.outcome = diff.outcome
+        if diff.outcome == TURRET:
+            mirror.killer = mirror.laser_source(*player)
+        elif diff.outcome in (SPIKES, DUCK):
+            mirror.killer = tuple(player)
+        mirror.moves += 1
+        self.result = StepResult(player_move, duck_moves[0], diff.outcome, destroyed, duck_moves)
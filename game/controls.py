@@ -0,0 +1,56 @@
+import time
+from collections import deque
+
+KEYMAP = {
+    "Up": 'w', "Down": 's', "Left": 'a', "Right": 'd',
+    "w": 'w', "a": 'a', "s": 's', "d": 'd'
+}
+
+LOOKAHEAD = 2  # Moves that can be queued while one is animating
+REPEAT_DELAY = 0.12  # s a key must be held before it repeats
+AUTOREPEAT_GAP = 0.03  # s, a release and press closer than this is OS key repeat
+
+
+class InputBuffer:
+    # Moves are only taken at animation boundaries. Taps queue up to
+    # `lookahead` moves; a held key is not queued at all but repeats once per
+    # boundary, so holding a direction moves at the animation's pace without
+    # dropping or doubling moves, whatever the OS key repeat rate is.
+    def __init__(self, lookahead=LOOKAHEAD):
+        self.lookahead = lookahead
+        self.queue = deque()
+        self.held = None
+        self.held_since = 0.0
+        self.released = None
+        self.released_at = 0.0
+
+    def press(self, command, now=None):
+        now = time.perf_counter() if now is None else now
+        if command == self.held:
+            return  # Key repeat while held
+        if command == self.released and now - self.released_at < AUTOREPEAT_GAP:
+            self.held, self.released = command, None  # Key repeat sent as release + press
+            return
+        self.held = command
+        self.held_since = now
+        if len(self.queue) < self.lookahead:
+            self.queue.append(command)
+
+    def release(self, command, now=None):
+        if command == self.held:
+            self.held = None
+            self.released = command
+            self.released_at = time.perf_counter() if now is None else now
+
+    def next_move(self, now=None):
+        # The next move to apply, or None; also returns how long until a held
+        # key starts repeating so the caller can check back then
+        now = time.perf_counter() if now is None else now
+        if self.queue:
+            return self.queue.popleft(), None
+        if self.held is not None:
+            wait = self.held_since + REPEAT_DELAY - now
+            if wait <= 0:
+                return self.held, None
+            return None, wait
+        return None, None
@@ -0,0 +1,183 @@
+import random
+from collections import namedtuple
+
+from hazards import HazardMap
+from levelgen import Level, generate_level, grid_size_for_level
+from pathfinding import DistanceField
+
+MOVES = {'w': (0, -1), 's': (0, 1), 'a': (-1, 0), 'd': (1, 0)}
+
+# Outcomes
+RUNNING = "running"
+ESCAPED = "escaped"
+SPIKES = "spikes"
+TURRET = "turret"
+DUCK = "duck"
+
+StepResult = namedtuple("StepResult", "player_move duck_move outcome destroyed_turret duck_moves")
+
+
+class GameState:
+    # Pure game rules, no tkinter and no timers: the Tk front-end and the
+    # batch runner both drive it through step().
+    def __init__(self, level=1, seed=None):
+        if seed is None:
+            seed = random.randrange(2**32)  # Always known, so any run can be reproduced
+        self.level = level
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.grid_size = grid_size_for_level(level)
+        self.outcome = RUNNING
+        self.killer = None
+        self.moves = 0
+        self.randomize_level()
+        self.index_level()
+
+    @classmethod
+    def from_layout(cls, grid_size, player, duck, exit, spikes=(), turrets=(), level=1, extra_ducks=(), seed=None):
+        # Build a state around a fixed layout instead of generating one; seed
+        # is only recorded, pass it when the layout came from GameState(level, seed)
+        state = cls.__new__(cls)
+        state.level = level
+        state.seed = seed
+        state.rng = random.Random(seed)
+        state.outcome = RUNNING
+        state.killer = None
+        state.moves = 0
+        state.load_layout(Level(grid_size, player, duck, exit, spikes, turrets, extra_ducks))
+        state.index_level()
+        return state
+
+    @property
+    def running(self):
+        return self.outcome == RUNNING
+
+    def randomize_level(self):
+        self.load_layout(generate_level(self.level, self.rng, self.grid_size))
+
+    def load_layout(self, layout):
+        self.grid_size = layout.grid_size
+        self.player_position = list(layout.player)
+        self.ducks = [list(layout.duck)] + [list(d) for d in layout.extra_ducks]
+        self.duck_position = self.ducks[0]  # The first duck, same list object
+        self.win_condition = list(layout.exit)
+        self.spikes = set(layout.spikes)
+        self.turrets = list(layout.turrets)
+
+    def layout(self):
+        return Level(
+            self.grid_size, tuple(self.player_position), tuple(self.duck_position),
+            tuple(self.win_condition), sorted(self.spikes), list(self.turrets),
+            [tuple(d) for d in self.ducks[1:]]
+        )
+
+    def step(self, command):
+        if not self.running:
+            return StepResult((0, 0), (0, 0), self.outcome, None, [(0, 0)] * len(self.ducks))
+        player_move = self.move_player(command)
+        duck_moves = self.move_ducks()
+        destroyed = self.check_status()
+        self.moves += 1
+        return StepResult(player_move, duck_moves[0], self.outcome, destroyed, duck_moves)
+
+    def move_player(self, command):
+        dx, dy = MOVES.get(command, (0, 0))
+        nx, ny = self.player_position[0] + dx, self.player_position[1] + dy
+        if (dx, dy) == (0, 0) or not (0 <= nx < self.grid_size and 0 <= ny < self.grid_size):
+            return 0, 0
+        self.player_position[0], self.player_position[1] = nx, ny
+        return dx, dy
+
+    def move_ducks(self):
+        # Every duck moves at most 1 step per player move, all steered by the
+        # same distance field. Ducks closest to the player go first (ties by
+        # index) and never step onto a cell another duck holds; a blocked duck
+        # tries its other shortest-path moves before staying put.
+        field = self.pathfinder
+        field.set_target(*self.player_position)
+        moves = [(0, 0)] * len(self.ducks)
+        if len(self.ducks) == 1:
+            moves[0] = field.next_step(*self.duck_position)
+        else:
+            order = []
+            for i, (x, y) in enumerate(self.ducks):
+                d = field.distance(x, y)
+                order.append((d is None, d or 0, i))
+            order.sort()
+            occupied = {tuple(d) for d in self.ducks}
+            for _, _, i in order:
+                x, y = self.ducks[i]
+                for mx, my in field.steps(x, y):
+                    if (x + mx, y + my) not in occupied:
+                        occupied.discard((x, y))
+                        occupied.add((x + mx, y + my))
+                        moves[i] = (mx, my)
+                        break
+        for duck, (mx, my) in zip(self.ducks, moves):
+            duck[0] += mx
+            duck[1] += my
+        return moves
+
+    def index_level(self):
+        # Per-level lookup structures, patched in place as turrets are destroyed
+        self.turret_bases = dict(self.turrets)  # Base position -> direction
+        self.hazards = HazardMap(self.grid_size, self.spikes, self.turrets)
+        self.pathfinder = DistanceField(self.grid_size, list(self.spikes) + list(self.turret_bases))
+
+    def smart_duck_move(self):
+        # Duck always takes shortest path to player, avoiding spikes and turrets
+        self.pathfinder.set_target(*self.player_position)
+        return self.pathfinder.next_step(*self.duck_position)
+
+    def random_duck_move(self):
+        moves = [(-1,0),(1,0),(0,-1),(0,1),(0,0)]
+        self.rng.shuffle(moves)
+        for dx, dy in moves:
+            nx, ny = self.duck_position[0] + dx, self.duck_position[1] + dy
+            if 0 <= nx < self.grid_size and 0 <= ny < self.grid_size:
+                if (nx, ny) not in self.spikes and (nx, ny) not in self.turret_bases:
+                    return dx, dy
+        return 0, 0
+
+    def in_laser(self, x, y):
+        return self.hazards.in_laser(x, y)
+
+    def laser_source(self, x, y):
+        # The turret whose laser covers the cell, nearest along its line
+        return self.hazards.laser_source(x, y)
+
+    def destroy_turret(self, x, y):
+        for idx, turret in enumerate(self.turrets):
+            if turret[0] == (x, y):
+                del self.turrets[idx]
+                del self.turret_bases[(x, y)]
+                self.hazards.remove_turret(turret)
+                self.pathfinder.clear_obstacle(x, y)
+                return turret
+        return None
+
+    def check_status(self):
+        # Updates self.outcome (and self.killer on death) and returns the
+        # turret destroyed this step, if any
+        px, py = self.player_position
+        # Check spikes
+        if self.hazards.is_spike(px, py):
+            self.outcome = SPIKES
+            self.killer = (px, py)
+            return None
+        # Check and remove turret if player steps on base
+        destroyed = None
+        if (px, py) in self.turret_bases:
+            destroyed = self.destroy_turret(px, py)
+        # Check turrets (laser lines)
+        if self.hazards.in_laser(px, py):
+            self.outcome = TURRET
+            self.killer = self.laser_source(px, py)
+        # Check duck
+        elif self.player_position in self.ducks:
+            self.outcome = DUCK
+            self.killer = tuple(self.player_position)
+        # Check win
+        elif self.player_position == self.win_condition:
+            self.outcome = ESCAPED
+        return destroyed
@@ -1,19 +1,45 @@
 import tkinter as tk
-import random
-from collections import deque
-import pickle
-import os
+import argparse
 import math
+import threading
+import time
+from array import array
+
+from animation import Animator
+from camera import Camera
+from client import Client, ServerError
+from controls import InputBuffer, KEYMAP
+from engine import GameState, RUNNING, ESCAPED, SPIKES, TURRET as TURRET_HIT, DUCK
+from levelgen import load_calibration
+from levelpack import LevelPack
+from profiler import Profiler
+from renderer import BoardRenderer
+from replay import Replay, ReplayInput
+from runstats import Run, RunStats, format_table
+from storage import SaveStore
+from theme import (
+    CELL_SIZE, BG_DARK, BG_PANEL, FG_LIGHT, ACCENT, ACCENT2, DANGER, PLAYER, GOLD,
+)
+
+MOVE_DURATION = 120  # ms
+FRAME_INTERVAL = 10  # ms
+HUD_INTERVAL = 250  # ms
+STATS_POLL = 20  # ms between checks that the stats writer is done
+STATS_WAIT = 2000  # ms to wait for it before showing what is stored
+MENU_FRAME_INTERVAL = 24  # ms
+MENU_MAX_INTERVAL = 96  # ms; under load the menu drops frames, it never queues them
+MENU_BOUNDS = (30, 30, 450, 150)
+MENU_SPRITES = [  # shape, x, y, dx, dy (px per MENU_FRAME_INTERVAL), half size, colour
+    ("oval", 60, 90, 2, 1, 24, DANGER),
+    ("oval", 420, 60, -2, 1, 24, DANGER),
+    ("rectangle", 120, 120, 1, -2, 20, PLAYER),
+    ("rectangle", 360, 40, -1, 2, 20, PLAYER),
+]
 
-BASE_GRID_SIZE = 6
-CELL_SIZE = 60
-ANIMATION_STEPS = 12
-ANIMATION_DELAY = 10  # ms
-
-SPIKE_COUNT = 3
-TURRET_COUNT = 2
-
-SAVE_FILE = "savepe.beta"
+SAVE_FILE = "savepe.json"
+LEGACY_SAVE_FILE = "savepe.beta"
+LAST_REPLAY_FILE = "last_run.efdr"
+SERVER_ERRORS = (OSError, ServerError)  # Lost, stalled (socket timeout) or refused by the server
 
 ACHIEVEMENTS = [
     (3, "Escaped 3 times!"),
@@ -21,24 +47,35 @@ ACHIEVEMENTS = [
     (10, "Duck Master: 10 Escapes!"),
 ]
 
-# Modern color palette
-BG_DARK = "#181c24"
-BG_PANEL = "#232a34"
-FG_LIGHT = "#e0e0e0"
-ACCENT = "#43e97b"
-ACCENT2 = "#4caf50"
-DANGER = "#f44336"
-TURRET = "#888"
-SPIKE = "#bdb76b"
-LASER = "#ffe066"
-PLAYER = "#2196f3"
-EXIT = "#43e97b"
-BORDER = "#2c3440"
-GOLD = "#ffd700"
+class LevelPrefetch:
+    # Generates a level on a worker thread while the win screen is up: layout,
+    # solvability check, hazard map and distance field template. Nothing else
+    # touches the state until result() hands it over.
+    def __init__(self, level, make_state=GameState):
+        self.level = level
+        self.make_state = make_state
+        self.state = None
+        self.thread = threading.Thread(target=self.run, name="level-prefetch", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            self.state = self.make_state(self.level)
+        except Exception:
+            self.state = None  # start_game generates it again and surfaces the error
+
+    def result(self):
+        self.thread.join()
+        return self.state
+
 
 class Game:
-    def __init__(self, root):
+    def __init__(self, root, profiler=None, pack=None, server=None):
         self.root = root
+        self.profiler = profiler
+        self.pack = pack
+        self.server = server  # (host, port); connected on the first game and after a failure
+        self.client = None
         self.root.option_add("*Font", "Arial 13")
         self.root.option_add("*Button.relief", "flat")
         self.root.option_add("*Button.bd", 0)
@@ -49,44 +86,58 @@ class Game:
         self.root.option_add("*Label.fg", FG_LIGHT)
         self.load_data()
         self.notification = None
+        self.animator = None
         self.main_menu_animating = False
+        self.menu_timer = None
+        self.menu_hidden = False
+        self.menu_unfocused = False
+        for sequence in ("<Map>", "<Unmap>", "<FocusIn>", "<FocusOut>"):
+            self.root.bind(sequence, self.menu_visibility, add="+")
+        self.hud = None
+        self.canvas = None
+        self.prefetch = None
+        self.replay_writer = None
+        self.run_started = None
         self.main_menu()
+        if self.profiler:
+            self.update_hud()
 
     def load_data(self):
-        if os.path.exists(SAVE_FILE):
-            try:
-                with open(SAVE_FILE, "rb") as f:
-                    data = pickle.load(f)
-                self.level = data.get("level", 1)
-                self.escapes = data.get("escapes", 0)
-                self.achievements_unlocked = set(data.get("achievements", []))
-            except Exception:
-                self.level = 1
-                self.escapes = 0
-                self.achievements_unlocked = set()
-        else:
+        self.store = SaveStore(SAVE_FILE, LEGACY_SAVE_FILE)
+        self.runs = RunStats()
+        try:
+            data = self.store.load()
+        except Exception:
+            data = {}
+        self.level = data.get("level", 1)
+        self.escapes = data.get("escapes", 0)
+        self.achievements_unlocked = set(data.get("achievements", []))
+        if self.pack:
+            # A pack session starts every player on its first level and keeps its own count
             self.level = 1
             self.escapes = 0
-            self.achievements_unlocked = set()
 
     def save_data(self):
+        # Queued for the background writer, never blocks a frame. Pack
+        # sessions leave the career progress alone
+        if self.pack:
+            return
         data = {
             "level": self.level,
             "escapes": self.escapes,
-            "achievements": list(self.achievements_unlocked)
+            "achievements": sorted(self.achievements_unlocked)
         }
-        with open(SAVE_FILE, "wb") as f:
-            pickle.dump(data, f)
+        self.store.save(data)
 
     def delete_data(self):
-        if os.path.exists(SAVE_FILE):
-            os.remove(SAVE_FILE)
+        self.store.clear()
+        self.runs.clear()
         self.level = 1
         self.escapes = 0
         self.achievements_unlocked = set()
         self.main_menu()
 
-    def main_menu(self):
+    def main_menu(self, message=None):
         self.clear_root()
         self.main_menu_animating = True
         self.menu_frame = tk.Frame(self.root, bg=BG_DARK)
@@ -94,19 +145,16 @@ class Game:
         tk.Label(
             self.menu_frame, text="Escape from Duck",
             font=("Arial Black", 38), fg=ACCENT, bg=BG_DARK
-        ).pack(pady=(60, 30))
+        ).pack(pady=(60, 30) if message is None else (60, 10))
+        if message is not None:
+            tk.Label(
+                self.menu_frame, text=message, font=("Arial", 14, "bold"), fg=DANGER, bg=BG_DARK
+            ).pack(pady=(0, 20))
         # Animated canvas
         self.menu_canvas = tk.Canvas(self.menu_frame, width=480, height=180, bg=BG_DARK, highlightthickness=0, bd=0)
         self.menu_canvas.pack(pady=(0, 18))
-        self.menu_ducks = [
-            {"x": 60, "y": 90, "dx": 2, "dy": 1, "color": DANGER},
-            {"x": 420, "y": 60, "dx": -2, "dy": 1, "color": DANGER},
-        ]
-        self.menu_players = [
-            {"x": 120, "y": 120, "dx": 1, "dy": -2, "color": PLAYER},
-            {"x": 360, "y": 40, "dx": -1, "dy": 2, "color": PLAYER},
-        ]
-        self.animate_main_menu()
+        self.main_menu_sprites()
+        self.run_main_menu()
         btn_style = {
             "font": ("Arial", 20, "bold"),
             "width": 16,
@@ -124,13 +172,17 @@ class Game:
             self.menu_frame, text="▶ Start Game", bg=ACCENT2, fg=BG_DARK,
             command=self.start_game, **btn_style
         ).pack(pady=18)
+        tk.Button(
+            self.menu_frame, text="📊 Statistics", bg=BG_PANEL, fg=FG_LIGHT,
+            command=self.show_stats, **btn_style
+        ).pack(pady=6)
         tk.Button(
             self.menu_frame, text="🗑 Delete Data", bg="#333", fg=GOLD,
             command=self.delete_data, **btn_style
         ).pack(pady=6)
         tk.Button(
             self.menu_frame, text="✖ Quit", bg=DANGER, fg=BG_DARK,
-            command=self.root.destroy, **btn_style
+            command=self.quit_game, **btn_style
         ).pack(pady=6)
         # --- Credits button ---
         tk.Button(
@@ -170,46 +222,175 @@ class Game:
             font=("Arial", 14), bg=ACCENT2, fg=BG_DARK, relief="flat", padx=12, pady=6
         ).pack(pady=(0, 18))
 
+    def show_stats(self):
+        self.clear_root()
+        frame = tk.Frame(self.root, bg=BG_DARK)
+        frame.pack(fill="both", expand=True)
+        tk.Label(
+            frame, text="Statistics", font=("Arial Black", 30), fg=ACCENT, bg=BG_DARK
+        ).pack(pady=(40, 20))
+        table = tk.Label(
+            frame, text="Loading...", font=("Courier", 13), fg=FG_LIGHT, bg=BG_DARK, justify="left"
+        )
+        table.pack(padx=30)
+        tk.Label(
+            frame, text="Runs by level: how they ended, and median moves to escape",
+            font=("Arial", 12, "italic"), fg=FG_LIGHT, bg=BG_DARK
+        ).pack(pady=(12, 0))
+        tk.Button(
+            frame, text="Back", command=self.main_menu,
+            font=("Arial", 14), bg=ACCENT2, fg=BG_DARK, relief="flat", padx=12, pady=6
+        ).pack(pady=24)
+        # The writer thread stores the latest runs; the table is read once it is done
+        self.runs.flush_soon()
+        self.fill_stats(table, STATS_WAIT)
+
+    def fill_stats(self, label, wait):
+        if not label.winfo_exists():
+            return
+        if not self.runs.idle() and wait > 0:
+            self.root.after(STATS_POLL, self.fill_stats, label, wait - STATS_POLL)
+            return
+        # Only the summary tables are read, so this stays quick however many runs there are
+        text = format_table(self.runs)
+        label.config(text=text if "\n" in text else "No runs yet.")
+
+    def main_menu_sprites(self):
+        # Items are created once and only moved afterwards; the motion of all
+        # sprites is one flat array of x, y, dx, dy, half size per sprite
+        self.menu_items = []
+        self.menu_motion = array("d")
+        for shape, x, y, dx, dy, half, color in MENU_SPRITES:
+            create = self.menu_canvas.create_oval if shape == "oval" else self.menu_canvas.create_rectangle
+            self.menu_items.append(create(x-half, y-half, x+half, y+half, fill=color, outline="#fff", width=3))
+            self.menu_motion.extend((x, y, dx, dy, half))
+        self.menu_interval = MENU_FRAME_INTERVAL
+        self.menu_last = None
+
+    def menu_visibility(self, event):
+        if event.widget is not self.root:
+            return
+        if event.type in (tk.EventType.Map, tk.EventType.Unmap):
+            self.menu_hidden = event.type == tk.EventType.Unmap
+        else:
+            self.menu_unfocused = event.type == tk.EventType.FocusOut
+        self.run_main_menu()
+
+    def run_main_menu(self):
+        # The menu only animates while it is open, mapped and focused
+        if self.main_menu_animating and not (self.menu_hidden or self.menu_unfocused):
+            if self.menu_timer is None:
+                self.menu_last = None
+                self.animate_main_menu()
+        elif self.menu_timer is not None:
+            self.root.after_cancel(self.menu_timer)
+            self.menu_timer = None
+
     def animate_main_menu(self):
+        self.menu_timer = None
         if not self.main_menu_animating:
             return
-        self.menu_canvas.delete("all")
-        # Animate ducks
-        for d in self.menu_ducks:
-            d["x"] += d["dx"]
-            d["y"] += d["dy"]
-            if d["x"] < 30 or d["x"] > 450:
-                d["dx"] *= -1
-            if d["y"] < 30 or d["y"] > 150:
-                d["dy"] *= -1
-            self.menu_canvas.create_oval(
-                d["x"]-24, d["y"]-24, d["x"]+24, d["y"]+24,
-                fill=d["color"], outline="#fff", width=3
-            )
-        # Animate players
-        for p in self.menu_players:
-            p["x"] += p["dx"]
-            p["y"] += p["dy"]
-            if p["x"] < 30 or p["x"] > 450:
-                p["dx"] *= -1
-            if p["y"] < 30 or p["y"] > 150:
-                p["dy"] *= -1
-            self.menu_canvas.create_rectangle(
-                p["x"]-20, p["y"]-20, p["x"]+20, p["y"]+20,
-                fill=p["color"], outline="#fff", width=3
-            )
-        self.root.after(24, self.animate_main_menu)
+        began = time.perf_counter()
+        elapsed = (began - self.menu_last) * 1000 if self.menu_last else self.menu_interval
+        self.menu_last = began
+        # Sprites move by the time that passed, so a longer interval only lowers the frame rate
+        scale = min(elapsed, MENU_MAX_INTERVAL) / MENU_FRAME_INTERVAL
+        x0, y0, x1, y1 = MENU_BOUNDS
+        motion = self.menu_motion
+        for i, item in enumerate(self.menu_items):
+            j = i * 5
+            x = motion[j] + motion[j+2] * scale
+            y = motion[j+1] + motion[j+3] * scale
+            if x < x0 or x > x1:
+                motion[j+2] = -motion[j+2]
+            if y < y0 or y > y1:
+                motion[j+3] = -motion[j+3]
+            motion[j] = x
+            motion[j+1] = y
+            half = motion[j+4]
+            self.menu_canvas.coords(item, x-half, y-half, x+half, y+half)
+        # Back off while frames run late or take a real share of the interval, recover when they don't
+        spent = (time.perf_counter() - began) * 1000
+        if elapsed > self.menu_interval * 1.5 or spent > self.menu_interval / 4:
+            self.menu_interval = min(MENU_MAX_INTERVAL, self.menu_interval * 1.5)
+        else:
+            self.menu_interval = max(MENU_FRAME_INTERVAL, self.menu_interval * 0.9)
+        self.menu_timer = self.root.after(int(self.menu_interval), self.animate_main_menu)
 
     def clear_root(self):
         self.main_menu_animating = False
+        self.run_main_menu()
+        if self.animator:
+            self.animator.stop()
         for widget in self.root.winfo_children():
             widget.destroy()
 
-    def start_game(self):
-        self.clear_root()
+    def start_game(self, replay=None, speed=1.0, state=None):
         self.is_running = True
-        self.grid_size = BASE_GRID_SIZE + (self.level - 1) // 3  # Increase grid size every 3 levels
-        self.randomize_level()
+        self.replaying = replay is not None
+        self.move_duration = MOVE_DURATION / speed
+        if self.replaying:
+            self.state = GameState(replay.level, replay.seed)
+            self.recording = None
+            self.run_started = None
+        else:
+            try:
+                self.state = state or self.new_state(self.level)
+            except SERVER_ERRORS as e:
+                self.server_lost(e)
+                return
+            self.recording = Replay(self.state.level, self.state.seed)
+            self.run_started = time.monotonic()
+            self.turrets_destroyed = 0
+            self.last_turret = None
+        self.grid_size = self.state.grid_size
+        # Level to level the widgets stay, only the board is redrawn
+        if self.canvas is not None and self.canvas.winfo_exists():
+            self.animator.stop()
+        else:
+            self.build_game_screen()
+        self.camera = Camera(self.canvas, self.grid_size)
+        self.canvas.configure(width=self.camera.span, height=self.camera.span)
+        if self.replaying:
+            status = f"Replay: level {replay.level}, seed {replay.seed}, {speed:g}x speed"
+        else:
+            status = f"Level {self.level}   Escapes: {self.escapes}   Use arrows or WASD"
+        self.set_status(status)
+        self.show_notification("")
+        # Buffered input, applied between moves
+        self.root.bind("<KeyPress>", self.key_down)
+        self.root.bind("<KeyRelease>", self.key_up)
+        self.inputs = ReplayInput(replay) if self.replaying else InputBuffer()
+        self.moving = False
+        self.draw()
+        if self.replaying:
+            self.animator.schedule(self.move_duration, self.pump_input)
+
+    def new_state(self, level):
+        # In a pack session level counts from 1 on the pack's first entry; past the end, levels are generated
+        if self.pack and level <= len(self.pack):
+            return self.pack.state(level - 1)
+        if self.server:
+            if self.client is None:
+                self.client = Client(*self.server)
+            return self.client.new_session(level)
+        return GameState(level)
+
+    def server_lost(self, error):
+        # After an error the stream may be cut mid-message, so the connection
+        # is dropped; the next game opens a new one
+        self.is_running = False
+        self.recording = None
+        self.run_started = None
+        for sequence in ("<KeyPress>", "<KeyRelease>", "<Key>"):
+            self.root.unbind(sequence)
+        if self.client:
+            self.client.close()
+            self.client = None
+        self.main_menu(f"Server error: {error or type(error).__name__}")
+
+    def build_game_screen(self):
+        self.clear_root()
         self.top_panel = tk.Frame(self.root, bg=BG_PANEL)
         self.top_panel.pack(fill="x")
         self.notification_label = tk.Label(
@@ -217,325 +398,171 @@ class Game:
             fg=GOLD, bg=BG_PANEL, pady=8
         )
         self.notification_label.pack(fill="x")
-        self.canvas = tk.Canvas(
-            self.root, width=self.grid_size*CELL_SIZE, height=self.grid_size*CELL_SIZE,
-            bg=BG_PANEL, highlightthickness=0, bd=0
-        )
+        if self.profiler:
+            self.hud = tk.Label(self.top_panel, font=("Courier", 11), fg=FG_LIGHT, bg=BG_PANEL)
+            if self.profiler.hud_visible:
+                self.hud.pack(fill="x")
+        self.canvas = tk.Canvas(self.root, bg=BG_PANEL, highlightthickness=0, bd=0)
         self.canvas.pack(pady=(0, 8))
+        self.renderer = BoardRenderer(self.canvas)
+        self.animator = Animator(self.root, self.canvas, FRAME_INTERVAL)
+        self.animator.frame_callbacks.append(self.follow_player)
         self.status = tk.Label(
             self.root,
-            text=f"Level {self.level}   Escapes: {self.escapes}   Use arrows or WASD",
             font=("Arial", 15, "bold"), bg=BG_DARK, fg=FG_LIGHT, pady=8
         )
         self.status.pack(fill="x")
-        # Fast repeat for holding keys
-        self.root.bind("<KeyPress>", self.key_down)
-        self.root.bind("<KeyRelease>", self.key_up)
-        self.held_key = None
-        self.key_repeat_id = None
-        self.draw()
 
     def set_status(self, text):
         if hasattr(self, "status") and self.status.winfo_exists():
             self.status.config(text=text)
 
     def key_down(self, event):
-        keymap = {
-            "Up": 'w', "Down": 's', "Left": 'a', "Right": 'd',
-            "w": 'w', "a": 'a', "s": 's', "d": 'd'
-        }
-        if event.keysym in keymap and self.held_key is None:
-            self.held_key = keymap[event.keysym]
-            self.handle_input(self.held_key)
-            self.key_repeat_id = self.root.after(120, self.repeat_key)
+        if event.keysym in KEYMAP:
+            self.inputs.press(KEYMAP[event.keysym])
+            self.pump_input()
         elif event.keysym == "q":
             self.quit_game()
+        elif event.keysym == "F3" and self.profiler:
+            self.toggle_hud()
 
     def key_up(self, event):
-        keymap = {
-            "Up": 'w', "Down": 's', "Left": 'a', "Right": 'd',
-            "w": 'w', "a": 'a', "s": 's', "d": 'd'
-        }
-        if event.keysym in keymap and self.held_key == keymap[event.keysym]:
-            self.held_key = None
-            if self.key_repeat_id:
-                self.root.after_cancel(self.key_repeat_id)
-                self.key_repeat_id = None
-
-    def repeat_key(self):
-        if self.held_key:
-            self.handle_input(self.held_key)
-            self.key_repeat_id = self.root.after(60, self.repeat_key)
-
-    def randomize_level(self):
-        positions = [(x, y) for x in range(self.grid_size) for y in range(self.grid_size)]
-        self.player_position = list(random.choice(positions))
-        positions.remove(tuple(self.player_position))
-        self.win_condition = list(random.choice(positions))
-        positions.remove(tuple(self.win_condition))
-        self.duck_position = list(random.choice(positions))
-        positions.remove(tuple(self.duck_position))
-        # Spikes
-        self.spikes = set()
-        for _ in range(min(SPIKE_COUNT + self.level // 2, self.grid_size * self.grid_size - 5)):
-            if not positions:
-                break
-            spike = random.choice(positions)
-            self.spikes.add(spike)
-            positions.remove(spike)
-        # Turrets
-        self.turrets = []
-        for _ in range(min(TURRET_COUNT + self.level // 3, self.grid_size * self.grid_size - 5 - len(self.spikes))):
-            if not positions:
-                break
-            turret = random.choice(positions)
-            direction = random.choice(['up', 'down', 'left', 'right'])
-            self.turrets.append((turret, direction))
-            positions.remove(turret)
+        if event.keysym in KEYMAP:
+            self.inputs.release(KEYMAP[event.keysym])
+
+    def pump_input(self):
+        if self.moving or not self.is_running:
+            return
+        command, wait = self.inputs.next_move()
+        if command is not None:
+            self.handle_input(command)
+        elif wait is not None:
+            self.animator.schedule(wait * 1000, self.pump_input)
+
+    def toggle_hud(self):
+        self.profiler.hud_visible = not self.profiler.hud_visible
+        if self.hud and self.hud.winfo_exists():
+            if self.profiler.hud_visible:
+                self.hud.pack(fill="x")
+            else:
+                self.hud.pack_forget()
+
+    def update_hud(self):
+        # Scheduled around the profiler so the HUD does not show up in its own numbers
+        if self.profiler.hud_visible and self.hud and self.hud.winfo_exists():
+            self.hud.config(text=self.profiler.hud_text())
+        self.profiler.raw_after(HUD_INTERVAL, self.update_hud)
 
     def draw(self):
-        self.canvas.delete("all")
-        # Draw grid
-        for i in range(self.grid_size):
-            for j in range(self.grid_size):
-                self.canvas.create_rectangle(
-                    i*CELL_SIZE, j*CELL_SIZE, (i+1)*CELL_SIZE, (j+1)*CELL_SIZE,
-                    outline=BORDER, width=2
-                )
-        # Draw exit
-        x, y = self.win_condition
-        self.canvas.create_rectangle(
-            x*CELL_SIZE+6, y*CELL_SIZE+6, (x+1)*CELL_SIZE-6, (y+1)*CELL_SIZE-6,
-            fill=EXIT, outline=ACCENT, width=4
-        )
-        # Draw spikes
-        for sx, sy in self.spikes:
-            self.canvas.create_polygon(
-                sx*CELL_SIZE+CELL_SIZE//2, sy*CELL_SIZE+12,
-                sx*CELL_SIZE+12, sy*CELL_SIZE+CELL_SIZE-12,
-                sx*CELL_SIZE+CELL_SIZE-12, sy*CELL_SIZE+CELL_SIZE-12,
-                fill=SPIKE, outline="#888", width=2
-            )
-        # Draw turrets
-        for (tx, ty), direction in self.turrets:
-            self.canvas.create_oval(
-                tx*CELL_SIZE+16, ty*CELL_SIZE+16, (tx+1)*CELL_SIZE-16, (ty+1)*CELL_SIZE-16,
-                fill=TURRET, outline="#555", width=3
-            )
-            # Draw turret barrel
-            if direction == 'up':
-                self.canvas.create_line(tx*CELL_SIZE+CELL_SIZE//2, ty*CELL_SIZE+16, tx*CELL_SIZE+CELL_SIZE//2, ty*CELL_SIZE, fill=FG_LIGHT, width=5)
-            elif direction == 'down':
-                self.canvas.create_line(tx*CELL_SIZE+CELL_SIZE//2, (ty+1)*CELL_SIZE-16, tx*CELL_SIZE+CELL_SIZE//2, (ty+1)*CELL_SIZE, fill=FG_LIGHT, width=5)
-            elif direction == 'left':
-                self.canvas.create_line(tx*CELL_SIZE+16, ty*CELL_SIZE+CELL_SIZE//2, tx*CELL_SIZE, ty*CELL_SIZE+CELL_SIZE//2, fill=FG_LIGHT, width=5)
-            elif direction == 'right':
-                self.canvas.create_line((tx+1)*CELL_SIZE-16, ty*CELL_SIZE+CELL_SIZE//2, (tx+1)*CELL_SIZE, ty*CELL_SIZE+CELL_SIZE//2, fill=FG_LIGHT, width=5)
-        # Draw duck
-        dx, dy = self.duck_position
-        self.duck = self.canvas.create_oval(
-            dx*CELL_SIZE+10, dy*CELL_SIZE+10, (dx+1)*CELL_SIZE-10, (dy+1)*CELL_SIZE-10,
-            fill=DANGER, outline="#fff", width=3
-        )
-        # Draw player
-        px, py = self.player_position
-        self.player = self.canvas.create_rectangle(
-            px*CELL_SIZE+10, py*CELL_SIZE+10, (px+1)*CELL_SIZE-10, (py+1)*CELL_SIZE-10,
-            fill=PLAYER, outline="#fff", width=3
-        )
-        # Draw turret lasers
-        for (tx, ty), direction in self.turrets:
-            if direction == 'up':
-                for y in range(ty-1, -1, -1):
-                    self.canvas.create_line(tx*CELL_SIZE+CELL_SIZE//2, (ty)*CELL_SIZE, tx*CELL_SIZE+CELL_SIZE//2, y*CELL_SIZE, fill=LASER, width=2, dash=(2,2))
-            elif direction == 'down':
-                for y in range(ty+1, self.grid_size):
-                    self.canvas.create_line(tx*CELL_SIZE+CELL_SIZE//2, (ty+1)*CELL_SIZE, tx*CELL_SIZE+CELL_SIZE//2, (y+1)*CELL_SIZE, fill=LASER, width=2, dash=(2,2))
-            elif direction == 'left':
-                for x in range(tx-1, -1, -1):
-                    self.canvas.create_line((tx)*CELL_SIZE, ty*CELL_SIZE+CELL_SIZE//2, x*CELL_SIZE, ty*CELL_SIZE+CELL_SIZE//2, fill=LASER, width=2, dash=(2,2))
-            elif direction == 'right':
-                for x in range(tx+1, self.grid_size):
-                    self.canvas.create_line((tx+1)*CELL_SIZE, ty*CELL_SIZE+CELL_SIZE//2, (x+1)*CELL_SIZE, ty*CELL_SIZE+CELL_SIZE//2, fill=LASER, width=2, dash=(2,2))
+        px, py = self.state.player_position
+        self.camera.center_on((px + 0.5) * CELL_SIZE, (py + 0.5) * CELL_SIZE)
+        self.renderer.build(self.state, self.camera.visible_cells())
+        self.duck = self.renderer.duck
+        self.ducks = self.renderer.ducks
+        self.player = self.renderer.player
+
+    def follow_player(self):
+        self.camera.follow(self.player)
+        self.renderer.cover(self.camera.visible_cells())
 
     def handle_input(self, command):
         if not self.is_running:
             return
-        dx, dy = 0, 0
-        if command == 'w':
-            dy = -1
-        elif command == 's':
-            dy = 1
-        elif command == 'a':
-            dx = -1
-        elif command == 'd':
-            dx = 1
-        self.animate_move('player', dx, dy, lambda: self.after_player_move())
-
-    def after_player_move(self):
-        # Duck moves only 1 step per player move (smoother, more fair)
-        self.smooth_duck_steps = []
-        mx, my = self.smart_duck_move()
-        if not (mx == 0 and my == 0):
-            self.smooth_duck_steps.append((mx, my))
-            # Actually move the duck position for next step calculation
-            self.duck_position[0] += mx
-            self.duck_position[1] += my
-        # Reset duck position for animation
-        for mx, my in reversed(self.smooth_duck_steps):
-            self.duck_position[0] -= mx
-            self.duck_position[1] -= my
-        self.animate_duck_steps(0)
-
-    def animate_duck_steps(self, idx):
-        if idx >= len(self.smooth_duck_steps):
-            self.root.after(ANIMATION_STEPS * ANIMATION_DELAY + 1, self.check_status)
+        try:
+            result = self.state.step(command)
+        except SERVER_ERRORS as e:
+            self.server_lost(e)
             return
-        mx, my = self.smooth_duck_steps[idx]
-        self.animate_move('duck', mx, my, lambda: self.animate_duck_steps(idx+1))
-
-    def animate_move(self, who, dx, dy, callback):
-        if dx == 0 and dy == 0:
-            callback()
-            return
-        if who == 'player':
-            pos = self.player_position
-            shape = self.player
-        else:
-            pos = self.duck_position
-            shape = self.duck
-        nx, ny = pos[0] + dx, pos[1] + dy
-        if not (0 <= nx < self.grid_size and 0 <= ny < self.grid_size):
-            callback()
-            return
-        step_x = (nx - pos[0]) * CELL_SIZE / ANIMATION_STEPS
-        step_y = (ny - pos[1]) * CELL_SIZE / ANIMATION_STEPS
-        def do_step(step=1):
-            try:
-                self.canvas.move(shape, step_x, step_y)
-            except tk.TclError:
-                return  # Shape was deleted, abort animation
-            if step < ANIMATION_STEPS:
-                self.root.after(ANIMATION_DELAY, lambda: do_step(step+1))
-            else:
-                pos[0], pos[1] = nx, ny
-                self.draw()
-                callback()
-        do_step()
-
-    def smart_duck_move(self):
-        # BFS pathfinding: duck always takes shortest path to player, avoiding spikes and turrets
-        px, py = self.player_position
-        dx, dy = self.duck_position
-
-        grid = [[True for _ in range(self.grid_size)] for _ in range(self.grid_size)]
-        for sx, sy in self.spikes:
-            grid[sx][sy] = False
-        for (tx, ty), _ in self.turrets:
-            grid[tx][ty] = False
-
-        visited = [[False for _ in range(self.grid_size)] for _ in range(self.grid_size)]
-        queue = deque()
-        queue.append((dx, dy, []))
-        visited[dx][dy] = True
-
-        while queue:
-            x, y, path = queue.popleft()
-            if (x, y) == (px, py):
-                if path:
-                    mx, my = path[0][0] - dx, path[0][1] - dy
-                    return mx, my
-                else:
-                    return 0, 0
-            for mx, my in [(-1,0),(1,0),(0,-1),(0,1)]:
-                nx, ny = x + mx, y + my
-                if 0 <= nx < self.grid_size and 0 <= ny < self.grid_size:
-                    if not visited[nx][ny] and grid[nx][ny]:
-                        visited[nx][ny] = True
-                        queue.append((nx, ny, path + [(nx, ny)]))
-        # No path found, stay in place
-        return 0, 0
-
-    def random_duck_move(self):
-        moves = [(-1,0),(1,0),(0,-1),(0,1),(0,0)]
-        random.shuffle(moves)
-        for dx, dy in moves:
-            nx, ny = self.duck_position[0] + dx, self.duck_position[1] + dy
-            if 0 <= nx < self.grid_size and 0 <= ny < self.grid_size:
-                if (nx, ny) not in self.spikes and all((nx, ny) != t[0] for t in self.turrets):
-                    return dx, dy
-        return 0, 0
-
-    def check_status(self):
-        px, py = self.player_position
-        # Check spikes
-        if (px, py) in self.spikes:
-            self.set_status("You stepped on spikes! Press any key for menu.")
+        if self.recording:
+            self.recording.record(command)
+        self.moving = True
+        if not self.state.running:
             self.is_running = False
-            self.show_notification("")
-            self.save_data()
+        canvas = self.canvas
+        # Player and ducks slide at the same time; the result shows when all land
+        moves = [(self.player, result.player_move)] + list(zip(self.ducks, result.duck_moves))
+        moving = False
+        for shape, (dx, dy) in moves:
+            if dx or dy:
+                self.animator.move(shape, dx * CELL_SIZE, dy * CELL_SIZE, self.move_duration)
+                moving = True
+        delay = self.move_duration if moving else 0
+        self.animator.schedule(delay, lambda: self.check_status(result, canvas))
+
+    def check_status(self, result, canvas):
+        if canvas is not self.canvas or not canvas.winfo_exists():
+            return  # Left the level while the move was animating
+        if result.destroyed_turret:
+            self.set_status("You destroyed a turret!")
+            self.renderer.remove_turret(result.destroyed_turret)
+            if not self.replaying:
+                self.turrets_destroyed += 1
+                self.last_turret = result.destroyed_turret[0]
+        outcome = result.outcome
+        if outcome != RUNNING:
+            self.finish_recording()
+            self.record_run()
+        if self.replaying and outcome != RUNNING:
+            self.set_status(f"Replay finished: {outcome}. Press any key for menu.")
             self.bind_menu_return()
             return
-        # Check and remove turret if player steps on base
-        for idx, ((tx, ty), direction) in enumerate(self.turrets):
-            if (px, py) == (tx, ty):
-                del self.turrets[idx]
-                self.set_status("You destroyed a turret!")
-                self.draw()
-                break
-        # Check turrets (laser lines)
-        for (tx, ty), direction in self.turrets:
-            if direction == 'up' and px == tx and py < ty:
-                self.set_status("Hit by turret! Press any key for menu.")
-                self.is_running = False
-                self.show_notification("")
-                self.save_data()
-                self.bind_menu_return()
-                return
-            if direction == 'down' and px == tx and py > ty:
-                self.set_status("Hit by turret! Press any key for menu.")
-                self.is_running = False
-                self.show_notification("")
-                self.save_data()
-                self.bind_menu_return()
-                return
-            if direction == 'left' and py == ty and px < tx:
-                self.set_status("Hit by turret! Press any key for menu.")
-                self.is_running = False
-                self.show_notification("")
-                self.save_data()
-                self.bind_menu_return()
-                return
-            if direction == 'right' and py == ty and px > tx:
-                self.set_status("Hit by turret! Press any key for menu.")
-                self.is_running = False
-                self.show_notification("")
-                self.save_data()
-                self.bind_menu_return()
-                return
-        # Check duck
-        if self.player_position == self.duck_position:
+        if outcome == SPIKES:
+            self.set_status("You stepped on spikes! Press any key for menu.")
+        elif outcome == TURRET_HIT:
+            self.set_status("Hit by turret! Press any key for menu.")
+        elif outcome == DUCK:
             self.set_status("The duck got you! Press any key for menu.")
-            self.is_running = False
-            self.show_notification("")
-            self.save_data()
-            self.bind_menu_return()
-            return
-        # Check win
-        if self.player_position == self.win_condition:
+        elif outcome == ESCAPED:
             self.escapes += 1
             self.level += 1
             self.set_status("You escaped! Press any key for next level.")
-            self.is_running = False
             self.check_achievements()
             self.save_data()
+            self.prefetch = LevelPrefetch(self.level, self.new_state)
             self.root.unbind("<KeyPress>")
             self.root.unbind("<KeyRelease>")
             self.root.bind("<Key>", lambda e: self.next_level())
             return
+        if outcome != RUNNING:
+            self.show_notification("")
+            self.save_data()
+            self.bind_menu_return()
+            return
         # Normal status
-        self.set_status(f"Level {self.level}   Escapes: {self.escapes}   Use arrows or WASD")
+        if not self.replaying:
+            self.set_status(f"Level {self.level}   Escapes: {self.escapes}   Use arrows or WASD")
         self.show_notification("")
+        self.moving = False
+        self.pump_input()
+
+    def finish_recording(self, background=True):
+        # Keep the last run so it can be replayed or attached to a bug report
+        if not self.recording or not self.recording.moves:
+            return
+        self.recording.outcome = self.state.outcome
+        if background:
+            self.replay_writer = threading.Thread(
+                target=self.recording.save, args=(LAST_REPLAY_FILE,), daemon=True
+            )
+            self.replay_writer.start()
+        else:
+            self.recording.save(LAST_REPLAY_FILE)
+        self.recording = None
+
+    def record_run(self):
+        # Finished runs, and on quit the one in progress (recorded as RUNNING)
+        if self.run_started is None or not self.state.moves:
+            return
+        state = self.state
+        killer = state.killer
+        if state.outcome == TURRET_HIT:
+            killer = killer[0]  # The turret's base
+        self.runs.record(Run(
+            time.time(), state.level, state.seed, state.grid_size, state.moves,
+            time.monotonic() - self.run_started, state.outcome, killer,
+            self.turrets_destroyed, self.last_turret,
+        ))
+        self.run_started = None
 
     def bind_menu_return(self):
         self.root.unbind("<KeyPress>")
@@ -544,7 +571,9 @@ class Game:
 
     def next_level(self):
         self.root.unbind("<Key>")
-        self.start_game()
+        prefetch, self.prefetch = self.prefetch, None
+        state = prefetch.result() if prefetch and prefetch.level == self.level else None
+        self.start_game(state=state)
 
     def check_achievements(self):
         for req, name in ACHIEVEMENTS:
@@ -563,12 +592,51 @@ class Game:
             self.notification_label.config(text="")
 
     def quit_game(self):
+        # The engine may already have ended the run while its last move animates
+        if self.replay_writer:
+            self.replay_writer.join()
+        if getattr(self, "recording", None):
+            self.finish_recording(background=False)
         self.save_data()
+        self.store.close()
+        self.record_run()
+        self.runs.close()
+        if self.client:
+            self.client.close()
         self.root.destroy()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Escape from Duck")
+    parser.add_argument("--replay", help="watch a recorded run, e.g. " + LAST_REPLAY_FILE)
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--pack", help="play the levels of a level pack (levelpack.py build)")
+    source.add_argument("--server", metavar="HOST:PORT", help="play on a game server (server.py)")
+    parser.add_argument("--profile", metavar="PATH", help="time frames and hot calls, show a HUD (F3) and write PATH on exit")
+    parser.add_argument("--trace", action="store_true", help="write the profile as a Chrome trace (chrome://tracing)")
+    args = parser.parse_args()
+    load_calibration()
     root = tk.Tk()
     root.title("Escape from Duck")
     root.configure(bg=BG_DARK)
-    game = Game(root)
-    root.mainloop()
\ No newline at end of file
+    profiler = None
+    if args.profile:
+        profiler = Profiler(args.profile, args.trace)
+        profiler.install(root)
+        profiler.instrument(Game, "draw", "handle_input", "check_status", "follow_player", "save_data")
+        profiler.instrument(GameState, "step", "move_ducks", "smart_duck_move", "check_status")
+        profiler.instrument(BoardRenderer, "build", "draw_board")
+        profiler.instrument(SaveStore, "write", "compact")
+        profiler.instrument(RunStats, "write", "query")
+    pack = LevelPack(args.pack) if args.pack else None
+    server = None
+    if args.server:
+        host, port = args.server.rsplit(":", 1)
+        server = (host, int(port))
+    game = Game(root, profiler, pack, server)
+    root.protocol("WM_DELETE_WINDOW", game.quit_game)
+    if args.replay:
+        game.start_game(replay=Replay.load(args.replay), speed=args.speed)
+    root.mainloop()
+    if profiler:
+        profiler.dump()
\ No newline at end of file
@@ -0,0 +1,77 @@
+def laser_rect(turret, grid_size):
+    # Cells covered by a turret's laser as an inclusive (x0, y0, x1, y1) box,
+    # empty (x0 > x1 or y0 > y1) when the turret faces the edge it sits on
+    (tx, ty), direction = turret
+    if direction == 'up':
+        return tx, 0, tx, ty-1
+    if direction == 'down':
+        return tx, ty+1, tx, grid_size-1
+    if direction == 'left':
+        return 0, ty, tx-1, ty
+    if direction == 'right':
+        return tx+1, ty, grid_size-1, ty
+    return 0, 0, -1, -1
+
+
+class HazardMap:
+    # Lasers always run to the grid edge, so the cells a row or column loses
+    # to them are a prefix and a suffix. Keeping only the innermost turret
+    # per row/column direction makes a laser check four comparisons, the
+    # build O(grid + turrets), and destroying a turret only re-derives the
+    # one line it sat on.
+    def __init__(self, grid_size, spikes=(), turrets=()):
+        self.grid_size = grid_size
+        self.spikes = set(spikes)
+        self.sources = {}
+        self.left = [-1] * grid_size  # Row y is lasered where x < left[y]
+        self.right = [grid_size] * grid_size  # ... or x > right[y]
+        self.up = [-1] * grid_size  # Column x is lasered where y < up[x]
+        self.down = [grid_size] * grid_size  # ... or y > down[x]
+        for turret in turrets:
+            direction, line, at = self.line(turret)
+            self.sources.setdefault((direction, line), []).append(at)
+        for direction, line in self.sources:
+            self.update_line(direction, line)
+
+    def line(self, turret):
+        (tx, ty), direction = turret
+        if direction in ('left', 'right'):
+            return direction, ty, tx
+        return direction, tx, ty
+
+    def remove_turret(self, turret):
+        direction, line, at = self.line(turret)
+        self.sources[(direction, line)].remove(at)
+        self.update_line(direction, line)
+
+    def update_line(self, direction, line):
+        sources = self.sources[(direction, line)]
+        if direction == 'left':
+            self.left[line] = max(sources, default=-1)
+        elif direction == 'right':
+            self.right[line] = min(sources, default=self.grid_size)
+        elif direction == 'up':
+            self.up[line] = max(sources, default=-1)
+        elif direction == 'down':
+            self.down[line] = min(sources, default=self.grid_size)
+
+    def is_spike(self, x, y):
+        return (x, y) in self.spikes
+
+    def in_laser(self, x, y):
+        return x < self.left[y] or x > self.right[y] or y < self.up[x] or y > self.down[x]
+
+    def laser_source(self, x, y):
+        # The innermost turret of a line that lasers the cell, rows first
+        if x < self.left[y]:
+            return (self.left[y], y), 'left'
+        if x > self.right[y]:
+            return (self.right[y], y), 'right'
+        if y < self.up[x]:
+            return (x, self.up[x]), 'up'
+        if y > self.down[x]:
+            return (x, self.down[x]), 'down'
+        return None
+
+    def is_deadly(self, x, y):
+        return (x, y) in self.spikes or self.in_laser(x, y)
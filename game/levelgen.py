@@ -0,0 +1,215 @@
+import json
+from collections import namedtuple
+
+from hazards import HazardMap, laser_rect
+
+BASE_GRID_SIZE = 6
+SPIKE_COUNT = 3
+TURRET_COUNT = 2
+SWARM_LEVEL = 20  # First level with more than one duck
+SWARM_EVERY = 3  # Levels per extra duck after that
+
+DIRECTIONS = ['up', 'down', 'left', 'right']
+
+BLOCKED = 2
+
+# Re-rolls of an unsolvable layout before the escape route is carved out instead
+MAX_ATTEMPTS = 4
+# From this many turrets per row about one sample in ten is solvable or
+# fewer, so re-rolls and the check are wasted: the first sample is repaired
+DENSE_TURRETS = 0.9
+
+CALIBRATION_FILE = "difficulty.json"  # Written by calibrate.py
+CALIBRATION_VERSION = 1
+
+# Level -> (grid size, spikes, turrets) measured by calibrate.py; levels
+# missing here use the formulas below
+CALIBRATION = {}
+
+Level = namedtuple("Level", "grid_size player duck exit spikes turrets extra_ducks", defaults=((),))
+
+
+def load_calibration(path=CALIBRATION_FILE):
+    # Replace the calibrated levels; a missing or unreadable file keeps the formulas
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if data.get("version") != CALIBRATION_VERSION:
+        return False
+    CALIBRATION.clear()
+    for level, entry in data["levels"].items():
+        CALIBRATION[int(level)] = (entry["grid_size"], entry["spikes"], entry["turrets"])
+    return True
+
+
+def set_calibration(levels):
+    # Pool initializer: workers generate levels with the parent's calibration
+    CALIBRATION.clear()
+    CALIBRATION.update(levels)
+
+
+def grid_size_for_level(level):
+    if level in CALIBRATION:
+        return CALIBRATION[level][0]
+    return formula_grid_size(level)
+
+
+def formula_grid_size(level):
+    return BASE_GRID_SIZE + (level - 1) // 3  # Increase grid size every 3 levels
+
+
+def level_counts(level, grid_size):
+    calibrated = CALIBRATION.get(level)
+    if calibrated and calibrated[0] == grid_size:
+        return calibrated[1], calibrated[2]
+    return formula_counts(level, grid_size)
+
+
+def formula_counts(level, grid_size):
+    cells = grid_size * grid_size
+    spikes = max(0, min(SPIKE_COUNT + level // 2, cells - 5))
+    turrets = max(0, min(TURRET_COUNT + level // 3, cells - 5 - spikes))
+    return spikes, turrets
+
+
+def duck_count_for_level(level):
+    if level < SWARM_LEVEL:
+        return 1
+    return 2 + (level - SWARM_LEVEL) // SWARM_EVERY
+
+
+def generate_level(level, rng, grid_size=None, spike_count=None, turret_count=None, duck_count=None):
+    # Same rng state in, same level out: seed the rng to reproduce a level
+    if grid_size is None:
+        grid_size = grid_size_for_level(level)
+    spikes, turrets = level_counts(level, grid_size)
+    if spike_count is not None:
+        spikes = spike_count
+    if turret_count is not None:
+        turrets = turret_count
+    if duck_count is None:
+        duck_count = duck_count_for_level(level)
+    if turrets >= DENSE_TURRETS * grid_size:
+        return repair(sample_layout(rng, grid_size, spikes, turrets, duck_count))
+    for _ in range(MAX_ATTEMPTS):
+        layout = sample_layout(rng, grid_size, spikes, turrets, duck_count)
+        if is_solvable(layout):
+            return layout
+    return repair(layout)
+
+
+def sample_cells(rng, cells, k):
+    # Sample k distinct cell indices. On big sparse grids drawing with
+    # random() and skipping repeats is several times cheaper than rng.sample
+    if 4 * k > cells:
+        return rng.sample(range(cells), k)
+    rand = rng.random
+    picked = dict.fromkeys(int(rand() * cells) for _ in range(k))
+    while len(picked) < k:
+        picked.setdefault(int(rand() * cells))
+    return list(picked)
+
+
+def sample_layout(rng, grid_size, spike_count, turret_count, duck_count=1):
+    # One sample without replacement covers every placed object
+    cells = grid_size * grid_size
+    picks = sample_cells(rng, cells, min(cells, 2 + duck_count + spike_count + turret_count))
+    positions = [(i % grid_size, i // grid_size) for i in picks]
+    spikes = positions[3:3 + spike_count]
+    turret_cells = positions[3 + spike_count:3 + spike_count + turret_count]
+    extra_ducks = positions[3 + spike_count + turret_count:]
+    directions = rng.choices(DIRECTIONS, k=len(turret_cells))
+    return Level(
+        grid_size, positions[0], positions[2], positions[1], spikes,
+        list(zip(turret_cells, directions)), extra_ducks
+    )
+
+
+def axis_spans(coords, grid_size):
+    # Split 0..grid_size-1 into single cells at the given coordinates and one
+    # span for each run between them. Returns each span's first coordinate and
+    # the span index of every given coordinate.
+    starts = []
+    index = {}
+    prev = 0
+    for c in sorted(set(coords)):
+        if c > prev:
+            starts.append(prev)
+        index[c] = len(starts)
+        starts.append(c)
+        prev = c + 1
+    if prev < grid_size:
+        starts.append(prev)
+    return starts, index
+
+
+def is_solvable(layout, hazards=None):
+    # Can the player walk to the exit without touching a spike or a laser?
+    # Turret bases count as free: stepping on one only ever removes hazards.
+    #
+    # Hazards only change at rows and columns holding an object, so the grid
+    # is compressed to those lines plus one block per run between them; every
+    # block is uniformly safe or deadly, and sparse levels shrink to a few
+    # hundred blocks. A bidirectional flood fill over the blocks then always
+    # grows the smaller side, so an enclosed player or exit fails fast.
+    if hazards is None:
+        hazards = HazardMap(layout.grid_size, layout.spikes, layout.turrets)
+    n = layout.grid_size
+    objects = [layout.player, layout.exit, *layout.spikes, *(t[0] for t in layout.turrets)]
+    xs, x_index = axis_spans([x for x, _ in objects], n)
+    ys, y_index = axis_spans([y for _, y in objects], n)
+    width, height = len(xs), len(ys)
+    deadly = hazards.is_deadly
+    (px, py), (ex, ey) = layout.player, layout.exit
+    # The player may start in a laser (hazards only hit after a move); the exit may not
+    if deadly(ex, ey):
+        return False
+    start, goal = (x_index[px], y_index[py]), (x_index[ex], y_index[ey])
+    if start == goal:
+        return True
+    owner = {start: 0, goal: 1}  # Side that reached a block, or BLOCKED
+    frontiers = [[start], [goal]]
+    while frontiers[0] and frontiers[1]:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        frontier = []
+        for x, y in frontiers[side]:
+            for nx, ny in ((x-1, y), (x+1, y), (x, y-1), (x, y+1)):
+                if not (0 <= nx < width and 0 <= ny < height):
+                    continue
+                seen = owner.get((nx, ny))
+                if seen is None:
+                    if deadly(xs[nx], ys[ny]):
+                        owner[(nx, ny)] = BLOCKED
+                    else:
+                        owner[(nx, ny)] = side
+                        frontier.append((nx, ny))
+                elif seen == 1 - side:
+                    return True
+        frontiers[side] = frontier
+    return False
+
+
+def repair(layout):
+    # Carve an L-shaped corridor along the player's row then the exit's column,
+    # dropping the spikes on it and the turrets whose lasers cross it
+    (px, py), (ex, ey) = layout.player, layout.exit
+    n = layout.grid_size
+    rx0, rx1 = min(px, ex), max(px, ex)
+    cy0, cy1 = min(py, ey), max(py, ey)
+    spikes = [
+        (x, y) for x, y in layout.spikes
+        if not (rx0 <= x <= rx1 and y == py) and not (x == ex and cy0 <= y <= cy1)
+    ]
+    # laser_crosses against the row and the column, inlined: dense levels
+    # test hundreds of turrets here
+    turrets = []
+    for turret in layout.turrets:
+        x0, y0, x1, y1 = laser_rect(turret, n)
+        if x0 > x1 or y0 > y1 or (
+            not (y0 <= py <= y1 and x0 <= rx1 and rx0 <= x1)
+            and not (x0 <= ex <= x1 and y0 <= cy1 and cy0 <= y1)
+        ):
+            turrets.append(turret)
+    return layout._replace(spikes=spikes, turrets=turrets)
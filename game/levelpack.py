@@ -0,0 +1,198 @@
+import argparse
+import mmap
+import os
+import struct
+import time
+
+from engine import GameState
+from hazards import HazardMap
+from levelgen import DIRECTIONS, Level, load_calibration
+from pathfinding import DistanceField
+from solver import LOST, WON, Solver, parse_levels
+
+MAGIC = b"EFDL"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHI")  # magic, version, flags, reserved, level count
+OFFSET = struct.Struct("<Q")  # One per level after the header: where its record starts
+RECORD = struct.Struct("<IQHHHHHHHH")  # level, seed, grid size, ducks, turrets, par, player x/y, exit x/y
+POSITION = struct.Struct("<HH")
+TURRET = struct.Struct("<HHB")  # x, y, index into DIRECTIONS
+HAS_FIELDS = 1
+UNREACHABLE = 0xFFFF
+
+
+class LevelPack:
+    # A file of ready-made levels. The header is followed by one offset per
+    # level, so level i is found with two reads whatever the pack size, and
+    # the file is mapped rather than read, so opening costs the same for ten
+    # levels or a million. A record holds the grid size, player, ducks and
+    # exit, a spike bitmask (bit y*n+x), the turrets, the solver's par and,
+    # optionally, every cell's safe walking distance to the exit as uint16.
+    # exit_field() returns that last part as a view into the map (native
+    # byte order, so little-endian hosts only).
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.flags, _, self.count = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version > VERSION:
+            raise ValueError("not a supported level pack")
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        try:
+            self.map.close()
+        except BufferError:
+            pass  # exit_field() views are still alive; the map is freed with the last one
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def offset(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return OFFSET.unpack_from(self.map, HEADER.size + index * OFFSET.size)[0]
+
+    def entry(self, index):
+        # (level number, seed, par, Level, offset of the exit field)
+        return decode_entry(self.map, self.offset(index))
+
+    def layout(self, index):
+        return self.entry(index)[3]
+
+    def exit_field(self, index):
+        if not self.flags & HAS_FIELDS:
+            return None
+        _, _, _, layout, at = self.entry(index)
+        cells = layout.grid_size * layout.grid_size
+        return memoryview(self.map)[at:at + 2 * cells].cast("H")
+
+    def state(self, index):
+        level, seed, _, layout, _ = self.entry(index)
+        return GameState.from_layout(
+            layout.grid_size, layout.player, layout.duck, layout.exit,
+            layout.spikes, layout.turrets, level, layout.extra_ducks, seed
+        )
+
+
+def decode_entry(data, at=0):
+    # One record from any buffer: a mapped pack, or a server START message
+    level, seed, n, ducks, turrets, par, px, py, ex, ey = RECORD.unpack_from(data, at)
+    at += RECORD.size
+    positions = [POSITION.unpack_from(data, at + i * POSITION.size) for i in range(ducks)]
+    at += ducks * POSITION.size
+    mask = data[at:at + (n * n + 7) // 8]
+    spikes = [
+        (i % n, i // n) for byte_index, byte in enumerate(mask) if byte
+        for i in range(byte_index * 8, byte_index * 8 + 8) if byte >> (i & 7) & 1
+    ]
+    at += len(mask)
+    turret_list = []
+    for _ in range(turrets):
+        x, y, direction = TURRET.unpack_from(data, at)
+        turret_list.append(((x, y), DIRECTIONS[direction]))
+        at += TURRET.size
+    layout = Level(n, (px, py), positions[0], (ex, ey), spikes, turret_list, positions[1:])
+    return level, seed, par, layout, at
+
+
+def exit_field(layout):
+    # Shortest safe walk from every cell to the exit: spikes and lasers block,
+    # turret bases don't (as in levelgen.is_solvable)
+    n = layout.grid_size
+    hazards = HazardMap(n, layout.spikes, layout.turrets)
+    deadly = [(x, y) for y in range(n) for x in range(n) if hazards.is_deadly(x, y)]
+    field = DistanceField(n, deadly)
+    field.set_target(*layout.exit)
+    dist = field.fill()
+    return [
+        d if d >= 0 else UNREACHABLE
+        for y in range(n) for d in dist[field.index(0, y):field.index(n, y)]
+    ]
+
+
+def encode_entry(level, seed, layout, par=0, fields=False):
+    n = layout.grid_size
+    ducks = [layout.duck, *layout.extra_ducks]
+    parts = [RECORD.pack(level, seed, n, len(ducks), len(layout.turrets), par, *layout.player, *layout.exit)]
+    parts += [POSITION.pack(*duck) for duck in ducks]
+    mask = bytearray((n * n + 7) // 8)
+    for x, y in layout.spikes:
+        i = y * n + x
+        mask[i >> 3] |= 1 << (i & 7)
+    parts.append(bytes(mask))
+    parts += [TURRET.pack(x, y, DIRECTIONS.index(direction)) for (x, y), direction in layout.turrets]
+    if fields:
+        parts.append(struct.pack(f"<{n * n}H", *exit_field(layout)))
+    return b"".join(parts)
+
+
+def write_pack(path, entries, fields=False):
+    # entries: (level, seed, layout, par) tuples, in play order
+    records = [encode_entry(level, seed, layout, par, fields) for level, seed, layout, par in entries]
+    offset = HEADER.size + OFFSET.size * len(records)
+    offsets = []
+    for record in records:
+        offsets.append(OFFSET.pack(offset))
+        offset += len(record)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, HAS_FIELDS if fields else 0, 0, len(records)))
+        f.writelines(offsets)
+        f.writelines(records)
+    os.replace(tmp, path)
+
+
+def build_entries(levels, seed=0, solve=False, winnable=False):
+    # Level i of the pack is GameState(levels[i], seed + i), so replays of
+    # pack runs still reproduce from their level and seed; with winnable the
+    # seeds the solver proves lost are skipped
+    for i, level in enumerate(levels):
+        layout = GameState(level, seed + i).layout()
+        par = 0
+        if solve or winnable:
+            solution = Solver(layout).solve()
+            if winnable and solution.result == LOST:
+                continue
+            par = len(solution.line) if solution.result == WON else 0
+        yield level, seed + i, layout, par
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and inspect Escape from Duck level packs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="write a pack of generated levels")
+    build.add_argument("path")
+    build.add_argument("levels", nargs="?", default="1-19", help="level or range, e.g. 1-19")
+    build.add_argument("-r", "--repeat", type=int, default=1, help="copies of each level number, new seeds")
+    build.add_argument("-s", "--seed", type=int, default=0)
+    build.add_argument("--solve", action="store_true", help="store each level's par from the solver")
+    build.add_argument("--winnable", action="store_true", help="leave out levels the solver proves lost")
+    build.add_argument("--fields", action="store_true", help="store exit distance fields")
+    info = commands.add_parser("info", help="list a pack's levels")
+    info.add_argument("path")
+    args = parser.parse_args()
+    load_calibration()  # Pack seeds then name the levels GameState(level, seed) plays
+
+    if args.command == "build":
+        levels = [level for level in parse_levels(args.levels) for _ in range(args.repeat)]
+        start = time.perf_counter()
+        entries = list(build_entries(levels, args.seed, args.solve, args.winnable))
+        write_pack(args.path, entries, args.fields)
+        print(f"Wrote {len(entries)} levels to {args.path} ({os.path.getsize(args.path)} bytes) "
+              f"in {time.perf_counter() - start:.2f}s")
+        return
+    with LevelPack(args.path) as pack:
+        for i in range(len(pack)):
+            level, seed, par, layout, _ = pack.entry(i)
+            print(f"{i:5}: level {level} seed {seed} grid {layout.grid_size} "
+                  f"spikes {len(layout.spikes)} turrets {len(layout.turrets)} par {par or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from engine import RUNNING
+from profiler import percentile
+from protocol import (
+    CLOSE, FRAME, HOST, MOVE, NEW, PORT, START, STATS, STATS_REPLY, TICK,
+    MOVE_COMMAND, NEW_SESSION, NO_SEED, SERVER_STATS, SESSION, decode_tick, frame,
+)
+from replay import COMMANDS
+
+CONNECTIONS = 20
+SESSIONS = 50  # Per connection
+MOVE_RATE = 5.0  # Moves per second per session
+DURATION = 10.0  # s measured, after WARMUP
+WARMUP = 2.0  # s
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = []  # s from sending a move to the diff that applied it
+        self.moves = 0
+        self.episodes = 0
+
+    def reset(self):
+        self.__init__()
+
+
+async def read_message(reader):
+    length, kind = FRAME.unpack(await reader.readexactly(FRAME.size))
+    return kind, await reader.readexactly(length) if length else b""
+
+
+async def bot(host, port, sessions, level, rate, stats, rng):
+    # One connection playing `sessions` games with random moves, each with at
+    # most one move in flight; a finished game is closed and a new one started
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(frame(NEW, NEW_SESSION.pack(level, NO_SEED)) * sessions)
+    playing = []
+    in_flight = {}
+
+    async def play():
+        while True:
+            now = time.perf_counter()
+            for session_id in playing:
+                if session_id not in in_flight:
+                    command = rng.randrange(len(COMMANDS))
+                    writer.write(frame(MOVE, MOVE_COMMAND.pack(session_id, command)))
+                    in_flight[session_id] = now
+            await writer.drain()
+            await asyncio.sleep(1 / rate)
+
+    player = asyncio.create_task(play())
+    try:
+        while True:
+            kind, payload = await read_message(reader)
+            if kind == START:
+                playing.append(SESSION.unpack_from(payload)[0])
+            elif kind == TICK:
+                now = time.perf_counter()
+                for diff in decode_tick(payload)[1]:
+                    sent = in_flight.pop(diff.session, None)
+                    if sent is not None:
+                        stats.latencies.append(now - sent)
+                        stats.moves += 1
+                    if diff.outcome != RUNNING:
+                        stats.episodes += 1
+                        playing.remove(diff.session)
+                        writer.write(frame(CLOSE, SESSION.pack(diff.session)))
+                        writer.write(frame(NEW, NEW_SESSION.pack(level, NO_SEED)))
+    finally:
+        player.cancel()
+        writer.close()
+
+
+async def server_stats(host, port):
+    # (CPU seconds, sessions, tick p50 ms, tick p99 ms)
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(frame(STATS))
+    try:
+        while True:
+            kind, payload = await read_message(reader)
+            if kind == STATS_REPLY:
+                return SERVER_STATS.unpack(payload)
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, connections, sessions, level, rate, duration, seed=0):
+    stats = LoadStats()
+    rng = random.Random(seed)
+    bots = [
+        asyncio.create_task(bot(host, port, sessions, level, rate, stats, random.Random(rng.random())))
+        for _ in range(connections)
+    ]
+    await asyncio.sleep(WARMUP)
+    stats.reset()
+    before = await server_stats(host, port)
+    start = time.perf_counter()
+    await asyncio.sleep(duration)
+    after = await server_stats(host, port)
+    elapsed = time.perf_counter() - start
+    for task in bots:
+        task.cancel()
+    await asyncio.gather(*bots, return_exceptions=True)
+    return stats, before, after, elapsed
+
+
+def start_server(port, tick):
+    here = os.path.dirname(os.path.abspath(__file__))
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(here, "server.py"), "--port", str(port), "--tick", str(tick)], cwd=here
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection((HOST, port), 0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the game server with bot sessions.")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="use a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=PORT + 1, help="port for the server this test starts")
+    parser.add_argument("--tick", type=float, default=1000 / 30, help="tick interval in ms of the started server")
+    parser.add_argument("-c", "--connections", type=int, default=CONNECTIONS)
+    parser.add_argument("-n", "--sessions", type=int, default=SESSIONS, help="sessions per connection")
+    parser.add_argument("-r", "--rate", type=float, default=MOVE_RATE, help="moves per second per session")
+    parser.add_argument("-l", "--level", type=int, default=5)
+    parser.add_argument("-d", "--duration", type=float, default=DURATION)
+    args = parser.parse_args()
+
+    server = None
+    if args.connect:
+        host, port = args.connect.rsplit(":", 1)
+        port = int(port)
+    else:
+        host, port = HOST, args.port
+        server = start_server(port, args.tick)
+    try:
+        stats, before, after, elapsed = asyncio.run(run_load(
+            host, port, args.connections, args.sessions, args.level, args.rate, args.duration
+        ))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    cpu = (after[0] - before[0]) / elapsed
+    sessions = after[1]
+    latencies = stats.latencies
+    print(f"{sessions} sessions on {args.connections} connections, {stats.moves / elapsed:.0f} moves/s, "
+          f"{stats.episodes / elapsed:.1f} games/s")
+    print(f"move latency  p50 {percentile(latencies, 0.5) * 1e3:.1f} ms  p99 {percentile(latencies, 0.99) * 1e3:.1f} ms")
+    print(f"server tick   p50 {after[2]:.2f} ms  p99 {after[3]:.2f} ms")
+    print(f"server CPU    {cpu:.0%} of a core -> about {sessions / cpu if cpu else 0:.0f} sessions per core "
+          f"at {args.rate:g} moves/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+UNSEEN = -1
+BLOCKED = -2
+
+# Same neighbour order as the original per-move BFS, so ties break identically
+NEIGHBOURS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+
+class DistanceField:
+    # BFS distances from the player over the obstacle layout (spikes and turret
+    # bases). Cells live in a flat list padded by a blocked border, so the
+    # search needs no bounds checks. The obstacle template is built once per
+    # level and only patched when a turret is destroyed; the field itself is
+    # grown layer by layer on demand and reused until the player moves.
+    def __init__(self, grid_size, obstacles=()):
+        self.grid_size = grid_size
+        self.width = grid_size + 2
+        self.offsets = [dx + dy * self.width for dx, dy in NEIGHBOURS]
+        template = [BLOCKED] * (self.width * self.width)
+        for y in range(grid_size):
+            row = (y + 1) * self.width + 1
+            template[row:row + grid_size] = [UNSEEN] * grid_size
+        for x, y in obstacles:
+            template[self.index(x, y)] = BLOCKED
+        self.template = template
+        self.target = None
+        self.dist = None
+        self.frontier = []
+        self.depth = 0
+
+    def index(self, x, y):
+        return (y + 1) * self.width + x + 1
+
+    def clear_obstacle(self, x, y):
+        self.template[self.index(x, y)] = UNSEEN
+        self.target = None
+
+    def set_target(self, x, y):
+        target = self.index(x, y)
+        if target == self.target:
+            return
+        self.target = target
+        self.dist = self.template[:]
+        self.depth = 0
+        if self.dist[target] == BLOCKED:
+            # Standing on a spike or turret base: nothing can reach the player
+            self.frontier = []
+        else:
+            self.dist[target] = 0
+            self.frontier = [target]
+
+    def expand(self):
+        # Grow the field by one BFS layer
+        dist = self.dist
+        width = self.width
+        self.depth += 1
+        depth = self.depth
+        frontier = []
+        append = frontier.append
+        # Unrolled over NEIGHBOURS, this loop is the whole cost of a duck move
+        for i in self.frontier:
+            j = i - 1
+            if dist[j] == UNSEEN:
+                dist[j] = depth
+                append(j)
+            j = i + 1
+            if dist[j] == UNSEEN:
+                dist[j] = depth
+                append(j)
+            j = i - width
+            if dist[j] == UNSEEN:
+                dist[j] = depth
+                append(j)
+            j = i + width
+            if dist[j] == UNSEEN:
+                dist[j] = depth
+                append(j)
+        self.frontier = frontier
+
+    def distance_at(self, i):
+        dist = self.dist
+        while dist[i] == UNSEEN and self.frontier:
+            self.expand()
+        return dist[i] if dist[i] >= 0 else None
+
+    def distance(self, x, y):
+        return self.distance_at(self.index(x, y))
+
+    def fill(self):
+        while self.frontier:
+            self.expand()
+        return self.dist
+
+    def steps(self, x, y):
+        # Every move one step closer to the target, in NEIGHBOURS order
+        i = self.index(x, y)
+        d = self.distance_at(i)
+        if not d:
+            return []
+        dist = self.dist
+        return [move for move, off in zip(NEIGHBOURS, self.offsets) if dist[i + off] == d - 1]
+
+    def next_step(self, x, y):
+        # First neighbour one step closer to the target, or stay put
+        steps = self.steps(x, y)
+        return steps[0] if steps else (0, 0)
@@ -0,0 +1,158 @@
+import functools
+import json
+import threading
+import time
+from collections import deque
+
+FRAME_HISTORY = 600  # Frames kept for the HUD and the summary
+CALL_HISTORY = 512  # Durations kept per instrumented name
+TRACE_EVENTS = 50000  # Calls kept for the Chrome trace
+FRAME_GAP = 0.25  # s; a longer pause between frames starts a new burst
+FRAME_CALLBACKS = ("Animator.tick", "Game.animate_main_menu")  # Timer callbacks that draw a frame
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Profiler:
+    # Opt-in instrumentation. install() wraps root.after so every timer
+    # callback is timed along with how late it ran; instrument() wraps
+    # methods on a class. Everything goes into fixed-size ring buffers, so
+    # a long session costs the same memory as a short one. A frame is one
+    # run of a FRAME_CALLBACKS timer and its time is the gap since the
+    # previous one, which is what a stutter looks like on screen.
+    def __init__(self, path=None, trace=False):
+        self.path = path
+        self.trace = trace
+        self.origin = time.perf_counter()
+        self.frames = deque(maxlen=FRAME_HISTORY)  # (start, interval, work)
+        self.last_frame = None
+        self.calls = {}  # name -> deque of durations
+        self.counts = {}
+        self.totals = {}
+        self.lateness = deque(maxlen=CALL_HISTORY)
+        self.events = deque(maxlen=TRACE_EVENTS)  # (name, start, duration, thread)
+        self.pending = set()
+        self.raw_after = None
+        self.hud_visible = True
+
+    def record(self, name, start, duration):
+        history = self.calls.get(name)
+        if history is None:
+            history = self.calls[name] = deque(maxlen=CALL_HISTORY)
+            self.counts[name] = 0
+            self.totals[name] = 0.0
+        history.append(duration)
+        self.counts[name] += 1
+        self.totals[name] += duration
+        self.events.append((name, start, duration, threading.get_ident()))
+
+    def wrap(self, name, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(name, start, time.perf_counter() - start)
+        return timed
+
+    def instrument(self, cls, *names):
+        for name in names:
+            setattr(cls, name, self.wrap(f"{cls.__name__}.{name}", getattr(cls, name)))
+
+    def install(self, root):
+        # Route the root's timers through the profiler
+        self.raw_after = after = root.after
+        cancel = root.after_cancel
+
+        def timed_after(ms, func=None, *args):
+            if func is None:
+                return after(ms)
+            name = getattr(func, "__qualname__", repr(func))
+            due = time.perf_counter() + ms / 1000
+            timer = []
+
+            def run(*args):
+                self.pending.discard(timer[0])
+                start = time.perf_counter()
+                self.lateness.append(max(0.0, start - due))
+                try:
+                    return func(*args)
+                finally:
+                    work = time.perf_counter() - start
+                    self.record(name, start, work)
+                    if name in FRAME_CALLBACKS:
+                        self.frame(start, work)
+            timer.append(after(ms, run, *args))
+            self.pending.add(timer[0])
+            return timer[0]
+
+        def timed_cancel(timer):
+            self.pending.discard(timer)
+            cancel(timer)
+
+        root.after = timed_after
+        root.after_cancel = timed_cancel
+
+    def frame(self, start, work):
+        last, self.last_frame = self.last_frame, start
+        if last is not None and start - last < FRAME_GAP:
+            self.frames.append((start, start - last, work))
+
+    def fps(self, now=None):
+        now = time.perf_counter() if now is None else now
+        recent = [interval for start, interval, _ in self.frames if start > now - 1.0]
+        return len(recent) / min(1.0, sum(recent)) if recent else 0.0
+
+    def hud_text(self):
+        intervals = [interval for _, interval, _ in self.frames]
+        return (
+            f"FPS {self.fps():5.1f}   frame p50 {percentile(intervals, 0.5) * 1e3:5.1f} ms"
+            f"  p99 {percentile(intervals, 0.99) * 1e3:5.1f} ms   timers {len(self.pending)}"
+        )
+
+    def summary(self):
+        def stats(values):
+            return {
+                "p50_ms": percentile(values, 0.5) * 1e3,
+                "p99_ms": percentile(values, 0.99) * 1e3,
+                "max_ms": max(values, default=0.0) * 1e3,
+            }
+        calls = {}
+        for name, history in self.calls.items():
+            calls[name] = dict(count=self.counts[name], total_ms=self.totals[name] * 1e3, **stats(history))
+        return {
+            "frames": dict(count=len(self.frames), **stats([interval for _, interval, _ in self.frames])),
+            "frame_work": stats([work for _, _, work in self.frames]),
+            "timer_lateness": stats(self.lateness),
+            "pending_timers": len(self.pending),
+            "calls": calls,
+        }
+
+    def trace_events(self):
+        # Chrome trace "complete" events, in microseconds since the profiler started
+        threads = {}
+        events = []
+        for name, start, duration, thread in self.events:
+            events.append({
+                "name": name, "ph": "X", "pid": 0,
+                "tid": threads.setdefault(thread, len(threads)),
+                "ts": (start - self.origin) * 1e6, "dur": duration * 1e6,
+            })
+        for start, interval, _ in self.frames:
+            events.append({
+                "name": "frame time", "ph": "C", "pid": 0, "tid": 0,
+                "ts": (start - self.origin) * 1e6, "args": {"ms": interval * 1e3},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self):
+        if not self.path:
+            return
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.trace_events() if self.trace else self.summary(), f, indent=None if self.trace else 2)
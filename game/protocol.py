@@ -0,0 +1,65 @@
+import struct
+from collections import namedtuple
+
+from replay import OUTCOMES
+
+HOST = "127.0.0.1"
+PORT = 7373
+
+# Every message is a FRAME header then `length` payload bytes. Positions
+# are uint16 pairs, commands index COMMANDS and outcomes index OUTCOMES,
+# as in replay files.
+FRAME = struct.Struct("<IB")  # payload length, message type
+MAX_PAYLOAD = 1 << 20
+
+# Client -> server
+NEW = 1  # NEW_SESSION: start a level; the server answers START
+MOVE = 2  # MOVE_COMMAND: queue a move, applied on a later tick
+WATCH = 3  # SESSION: follow another session; the server answers START
+CLOSE = 4  # SESSION: end an owned session
+STATS = 5  # Empty; the server answers STATS_REPLY
+
+# Server -> client
+START = 16  # SESSION, then a levelpack record with the level as it is now
+TICK = 17  # TICK_HEADER, then one DIFF per session that changed
+ERROR = 18  # UTF-8 text
+STATS_REPLY = 19
+
+NO_SEED = 2**64 - 1  # In NEW: let the server pick
+NEW_SESSION = struct.Struct("<IQ")  # level, seed
+MOVE_COMMAND = struct.Struct("<IB")  # session, command
+SESSION = struct.Struct("<I")
+TICK_HEADER = struct.Struct("<II")  # tick number, diff count
+DIFF = struct.Struct("<IBHHHH")  # session, outcome, destroyed turrets, ducks, player x, y
+POSITION = struct.Struct("<HH")
+SERVER_STATS = struct.Struct("<dIdd")  # CPU seconds, sessions, tick p50 ms, tick p99 ms
+
+# A session's state after a tick: the turrets destroyed since the last diff
+# this client got for it, then every duck
+Diff = namedtuple("Diff", "session outcome player destroyed ducks")
+
+
+def frame(kind, payload=b""):
+    return FRAME.pack(len(payload), kind) + payload
+
+
+def encode_diff(session, state, destroyed):
+    parts = [DIFF.pack(
+        session, OUTCOMES.index(state.outcome), len(destroyed), len(state.ducks), *state.player_position
+    )]
+    parts += [POSITION.pack(*position) for position in destroyed]
+    parts += [POSITION.pack(*duck) for duck in state.ducks]
+    return b"".join(parts)
+
+
+def decode_tick(payload):
+    tick, count = TICK_HEADER.unpack_from(payload)
+    at = TICK_HEADER.size
+    diffs = []
+    for _ in range(count):
+        session, outcome, destroyed, ducks, px, py = DIFF.unpack_from(payload, at)
+        at += DIFF.size
+        positions = [POSITION.unpack_from(payload, at + i * POSITION.size) for i in range(destroyed + ducks)]
+        at += (destroyed + ducks) * POSITION.size
+        diffs.append(Diff(session, OUTCOMES[outcome], (px, py), positions[:destroyed], positions[destroyed:]))
+    return tick, diffs
@@ -0,0 +1,182 @@
+from bisect import bisect_left
+
+from theme import CELL_SIZE, BORDER, EXIT, ACCENT, SPIKE, TURRET, FG_LIGHT, DANGER, PLAYER, LASER
+
+SPRITE_INSET = 10
+WINDOW_MARGIN = 6  # Cells drawn beyond the visible ones on each side
+
+
+class StaticLayer:
+    # What never moves during a level, indexed by row so a window only
+    # visits the objects inside it: the exit, and the sorted x of every spike
+    # and turret per row. Built once per level; turrets destroyed later are
+    # skipped by checking the state.
+    def __init__(self, state):
+        self.grid_size = state.grid_size
+        self.exit = tuple(state.win_condition)
+        self.spikes = rows_of(state.spikes)
+        self.turrets = rows_of(state.turret_bases)
+        self.directions = dict(state.turret_bases)
+
+
+def rows_of(cells):
+    rows = {}
+    for x, y in cells:
+        rows.setdefault(y, []).append(x)
+    for xs in rows.values():
+        xs.sort()
+    return rows
+
+
+def row_between(rows, y, x0, x1):
+    # The x of row y's objects with x0 <= x < x1
+    xs = rows.get(y, ())
+    return xs[bisect_left(xs, x0):bisect_left(xs, x1)]
+
+
+class BoardRenderer:
+    # Retained-mode board: static items are created once and kept by id,
+    # later frames only move the sprites. Only the cells inside `window`
+    # (the camera's view plus a margin) get items, so the item count depends
+    # on the view and not on the grid; the board is rebuilt when the view
+    # leaves the window. The grid is one line per row and column edge, each
+    # lasered run one line, and a destroyed turret only takes its own items
+    # and the lasers with it.
+    def __init__(self, canvas, cell_size=CELL_SIZE):
+        self.canvas = canvas
+        self.cell_size = cell_size
+        self.player = None
+        self.duck = None
+        self.ducks = []
+        self.state = None
+        self.layer = None
+        self.window = None
+
+    def build(self, state, view=None):
+        self.canvas.delete("all")
+        self.state = state
+        self.layer = StaticLayer(state)
+        # Draw ducks
+        self.ducks = [
+            self.canvas.create_oval(
+                *self.sprite_coords(*duck),
+                fill=DANGER, outline="#fff", width=3
+            )
+            for duck in state.ducks
+        ]
+        self.duck = self.ducks[0]
+        # Draw player
+        self.player = self.canvas.create_rectangle(
+            *self.sprite_coords(*state.player_position),
+            fill=PLAYER, outline="#fff", width=3
+        )
+        self.window = None
+        self.cover(view or (0, 0, state.grid_size, state.grid_size))
+
+    def cover(self, view):
+        # Make sure the cells of view (x0, y0, x1, y1, exclusive) have items
+        x0, y0, x1, y1 = view
+        wx0, wy0, wx1, wy1 = self.window or (0, 0, 0, 0)
+        if self.window and wx0 <= x0 and wy0 <= y0 and x1 <= wx1 and y1 <= wy1:
+            return
+        n = self.state.grid_size
+        self.window = (
+            max(0, x0 - WINDOW_MARGIN), max(0, y0 - WINDOW_MARGIN),
+            min(n, x1 + WINDOW_MARGIN), min(n, y1 + WINDOW_MARGIN),
+        )
+        self.draw_board()
+
+    def draw_board(self):
+        canvas = self.canvas
+        layer = self.layer
+        turret_bases = self.state.turret_bases
+        c = self.cell_size
+        x0, y0, x1, y1 = self.window
+        canvas.delete("board")
+        board = ("board",)
+        # Draw grid
+        for i in range(x0, x1 + 1):
+            canvas.create_line(i*c, y0*c, i*c, y1*c, fill=BORDER, width=2, tags=board)
+        for j in range(y0, y1 + 1):
+            canvas.create_line(x0*c, j*c, x1*c, j*c, fill=BORDER, width=2, tags=board)
+        # Draw exit
+        x, y = layer.exit
+        if x0 <= x < x1 and y0 <= y < y1:
+            canvas.create_rectangle(
+                x*c+6, y*c+6, (x+1)*c-6, (y+1)*c-6,
+                fill=EXIT, outline=ACCENT, width=4, tags=board
+            )
+        for sy in range(y0, y1):
+            # Draw spikes
+            for sx in row_between(layer.spikes, sy, x0, x1):
+                canvas.create_polygon(
+                    sx*c+c//2, sy*c+12,
+                    sx*c+12, sy*c+c-12,
+                    sx*c+c-12, sy*c+c-12,
+                    fill=SPIKE, outline="#888", width=2, tags=board
+                )
+            # Draw turrets
+            for tx in row_between(layer.turrets, sy, x0, x1):
+                if (tx, sy) in turret_bases:
+                    self.draw_turret(tx, sy, layer.directions[(tx, sy)])
+        self.draw_lasers()
+        # Sprites stay on top of the board, lasers on top of the sprites
+        canvas.tag_lower("board")
+        canvas.tag_raise("laser")
+
+    def draw_turret(self, tx, ty, direction):
+        canvas = self.canvas
+        c = self.cell_size
+        board = ("board", f"turret{tx},{ty}")
+        canvas.create_oval(
+            tx*c+16, ty*c+16, (tx+1)*c-16, (ty+1)*c-16,
+            fill=TURRET, outline="#555", width=3, tags=board
+        )
+        # Draw turret barrel
+        if direction == 'up':
+            canvas.create_line(tx*c+c//2, ty*c+16, tx*c+c//2, ty*c, fill=FG_LIGHT, width=5, tags=board)
+        elif direction == 'down':
+            canvas.create_line(tx*c+c//2, (ty+1)*c-16, tx*c+c//2, (ty+1)*c, fill=FG_LIGHT, width=5, tags=board)
+        elif direction == 'left':
+            canvas.create_line(tx*c+16, ty*c+c//2, tx*c, ty*c+c//2, fill=FG_LIGHT, width=5, tags=board)
+        elif direction == 'right':
+            canvas.create_line((tx+1)*c-16, ty*c+c//2, (tx+1)*c, ty*c+c//2, fill=FG_LIGHT, width=5, tags=board)
+
+    def draw_lasers(self):
+        # Overlapping lasers look the same, so each row and column gets one
+        # line per lasered run, clipped to the window
+        canvas = self.canvas
+        hazards = self.state.hazards
+        c = self.cell_size
+        x0, y0, x1, y1 = self.window
+        lasers = ("board", "laser")
+        for y in range(y0, y1):
+            mid = y*c + c//2
+            end = min(hazards.left[y], x1)
+            if end > x0:
+                canvas.create_line(x0*c, mid, end*c, mid, fill=LASER, width=2, dash=(2,2), tags=lasers)
+            start = max(hazards.right[y] + 1, x0)
+            if start < x1:
+                canvas.create_line(start*c, mid, x1*c, mid, fill=LASER, width=2, dash=(2,2), tags=lasers)
+        for x in range(x0, x1):
+            mid = x*c + c//2
+            end = min(hazards.up[x], y1)
+            if end > y0:
+                canvas.create_line(mid, y0*c, mid, end*c, fill=LASER, width=2, dash=(2,2), tags=lasers)
+            start = max(hazards.down[x] + 1, y0)
+            if start < y1:
+                canvas.create_line(mid, start*c, mid, y1*c, fill=LASER, width=2, dash=(2,2), tags=lasers)
+
+    def sprite_coords(self, x, y):
+        c = self.cell_size
+        return x*c+SPRITE_INSET, y*c+SPRITE_INSET, (x+1)*c-SPRITE_INSET, (y+1)*c-SPRITE_INSET
+
+    def remove_turret(self, turret):
+        # The turret is already gone from the state: drop its items and
+        # redraw the lasers, which the hazard map has already shortened
+        if self.window:
+            x, y = turret[0]
+            self.canvas.delete(f"turret{x},{y}")
+            self.canvas.delete("laser")
+            self.draw_lasers()
+            self.canvas.tag_raise("laser")
@@ -0,0 +1,105 @@
+import argparse
+import struct
+import time
+
+from engine import GameState, RUNNING, ESCAPED, SPIKES, TURRET, DUCK
+from levelgen import load_calibration
+
+MAGIC = b"EFDR"
+VERSION = 1
+HEADER = struct.Struct("<4sBIQIB")  # magic, version, level, seed, move count, outcome
+
+COMMANDS = "wasd"
+CODES = {command: code for code, command in enumerate(COMMANDS)}
+OUTCOMES = [RUNNING, ESCAPED, SPIKES, TURRET, DUCK]
+
+
+class Replay:
+    # A run is its level, its seed and the moves made: the engine is
+    # deterministic, so that is enough to rebuild every frame. Moves are kept
+    # as one byte each while recording (a bytearray append per move) and
+    # packed four to a byte on disk.
+    def __init__(self, level, seed, moves=b"", outcome=RUNNING):
+        self.level = level
+        self.seed = seed
+        self.moves = bytearray(moves)
+        self.outcome = outcome
+
+    def record(self, command):
+        self.moves.append(CODES[command])
+
+    def commands(self):
+        return [COMMANDS[code] for code in self.moves]
+
+    def encode(self):
+        packed = bytearray((len(self.moves) + 3) // 4)
+        for i, code in enumerate(self.moves):
+            packed[i >> 2] |= code << ((i & 3) * 2)
+        header = HEADER.pack(MAGIC, VERSION, self.level, self.seed, len(self.moves), OUTCOMES.index(self.outcome))
+        return header + bytes(packed)
+
+    @classmethod
+    def decode(cls, data):
+        magic, version, level, seed, count, outcome = HEADER.unpack_from(data)
+        if magic != MAGIC or version > VERSION:
+            raise ValueError("not a supported replay file")
+        packed = data[HEADER.size:]
+        moves = bytes((packed[i >> 2] >> ((i & 3) * 2)) & 3 for i in range(count))
+        return cls(level, seed, moves, OUTCOMES[outcome])
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.encode())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.decode(f.read())
+
+
+class ReplayInput:
+    # Stands in for controls.InputBuffer: feeds the recorded moves, one per
+    # animation boundary, and ignores the keyboard
+    def __init__(self, replay):
+        self.commands = iter(replay.commands())
+
+    def press(self, command, now=None):
+        pass
+
+    def release(self, command, now=None):
+        pass
+
+    def next_move(self, now=None):
+        return next(self.commands, None), None
+
+
+def play_headless(replay):
+    # Re-run a replay as fast as the engine goes and return the final state
+    state = GameState(replay.level, replay.seed)
+    for command in replay.commands():
+        if not state.running:
+            break
+        state.step(command)
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check Escape from Duck replays headless.")
+    parser.add_argument("replays", nargs="+")
+    args = parser.parse_args()
+    load_calibration()  # Runs are recorded against the game's difficulty cache
+    failed = 0
+    for path in args.replays:
+        replay = Replay.load(path)
+        start = time.perf_counter()
+        state = play_headless(replay)
+        elapsed = time.perf_counter() - start
+        ok = state.outcome == replay.outcome and state.moves == len(replay.moves)
+        failed += not ok
+        print(f"{path}: level {replay.level} seed {replay.seed} {len(replay.moves)} moves -> {state.outcome}"
+              f" in {elapsed * 1e3:.2f} ms{'' if ok else f' (recorded {replay.outcome}) MISMATCH'}")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
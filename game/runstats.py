@@ -0,0 +1,290 @@
+import argparse
+import atexit
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter, namedtuple
+
+from engine import ESCAPED
+from replay import OUTCOMES
+
+STATS_FILE = "runs.sqlite"
+SCHEMA_VERSION = 1
+BATCH_SIZE = 256  # Runs written per transaction at most
+FLUSH_DELAY = 2.0  # s a finished run may wait in memory before it is written
+
+# outcome is an index into OUTCOMES; RUNNING marks a run left unfinished.
+# killer is the spike, turret base or duck cell that ended the run.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    finished REAL NOT NULL,
+    level INTEGER NOT NULL,
+    seed INTEGER,
+    grid_size INTEGER NOT NULL,
+    moves INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    outcome INTEGER NOT NULL,
+    killer_x INTEGER,
+    killer_y INTEGER,
+    turrets_destroyed INTEGER NOT NULL,
+    turret_x INTEGER,
+    turret_y INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_by_level ON runs (level, outcome);
+CREATE INDEX IF NOT EXISTS runs_by_outcome ON runs (outcome, moves);
+CREATE TABLE IF NOT EXISTS outcome_counts (
+    level INTEGER NOT NULL,
+    outcome INTEGER NOT NULL,
+    runs INTEGER NOT NULL,
+    PRIMARY KEY (level, outcome)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS move_counts (
+    level INTEGER NOT NULL,
+    outcome INTEGER NOT NULL,
+    moves INTEGER NOT NULL,
+    runs INTEGER NOT NULL,
+    PRIMARY KEY (level, outcome, moves)
+) WITHOUT ROWID;
+"""
+
+Run = namedtuple(
+    "Run", "finished level seed grid_size moves duration outcome killer turrets_destroyed turret",
+    defaults=(None, 0, None),
+)
+
+
+class RunStats:
+    # Every finished run, in SQLite. record() only appends to a list; a
+    # background thread writes the list in one transaction once BATCH_SIZE
+    # runs are waiting or the oldest has waited FLUSH_DELAY seconds, so the
+    # UI thread never waits on the disk. Next to the raw rows, each batch
+    # adds to two small summary tables (runs per level and outcome, and a
+    # histogram of moves per level and outcome). The stats screen reads only
+    # those, so its queries cost the same for a hundred runs or millions.
+    # Reads see what the writer has committed; flush_soon() and idle() let a
+    # caller have the waiting runs written without doing it itself.
+    def __init__(self, path=STATS_FILE, batch_size=BATCH_SIZE, flush_delay=FLUSH_DELAY):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_delay = flush_delay
+        self.pending = []
+        self.due = 0.0
+        self.closed = False
+        self.writing = False
+        self.generation = 0  # Bumped by clear(), so batches taken before it are dropped
+        self.cond = threading.Condition()
+        self.io_lock = threading.Lock()
+        self.thread = None
+        atexit.register(self.close)
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")  # Readers never wait for the writer
+        db.execute("PRAGMA synchronous=NORMAL")
+        if db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            db.executescript(SCHEMA)
+            db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        return db
+
+    def record(self, run):
+        with self.cond:
+            if not self.pending:
+                self.due = time.monotonic() + self.flush_delay
+            self.pending.append(run)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="stats-writer", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def flush_soon(self):
+        # Ask the writer to write what is waiting now instead of after FLUSH_DELAY
+        with self.cond:
+            self.due = 0.0
+            self.cond.notify()
+
+    def idle(self):
+        with self.cond:
+            return not self.pending and not self.writing
+
+    def flush(self):
+        with self.cond:
+            runs, self.pending = self.pending, []
+            generation = self.generation
+        if runs:
+            self.write(runs, generation)
+
+    def close(self):
+        # The writer finishes the batch it holds; the rest is written here
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.flush()
+
+    def clear(self):
+        with self.cond:
+            self.pending = []
+            self.generation += 1
+        with self.io_lock:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.closed and (
+                    not self.pending
+                    or len(self.pending) < self.batch_size and time.monotonic() < self.due
+                ):
+                    timeout = self.due - time.monotonic() if self.pending else None
+                    self.cond.wait(timeout)
+                if self.closed:
+                    return
+                runs, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+                self.due = time.monotonic() + self.flush_delay
+                self.writing = True
+                generation = self.generation
+            try:
+                self.write(runs, generation)
+            finally:
+                with self.cond:
+                    self.writing = False
+
+    def write(self, runs, generation=None):
+        rows = []
+        outcomes = Counter()
+        moves = Counter()
+        for run in runs:
+            outcome = OUTCOMES.index(run.outcome)
+            killer = run.killer or (None, None)
+            turret = run.turret or (None, None)
+            rows.append((
+                run.finished, run.level, run.seed, run.grid_size, run.moves, run.duration,
+                outcome, *killer, run.turrets_destroyed, *turret,
+            ))
+            outcomes[run.level, outcome] += 1
+            moves[run.level, outcome, run.moves] += 1
+        with self.io_lock:
+            if generation is not None and generation != self.generation:
+                return  # Taken before a clear()
+            db = self.connect()
+            try:
+                with db:
+                    db.executemany(
+                        "INSERT INTO runs (finished, level, seed, grid_size, moves, duration, outcome,"
+                        " killer_x, killer_y, turrets_destroyed, turret_x, turret_y)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                    )
+                    db.executemany(
+                        "INSERT INTO outcome_counts VALUES (?, ?, ?)"
+                        " ON CONFLICT (level, outcome) DO UPDATE SET runs = runs + excluded.runs",
+                        [(*key, n) for key, n in outcomes.items()]
+                    )
+                    db.executemany(
+                        "INSERT INTO move_counts VALUES (?, ?, ?, ?)"
+                        " ON CONFLICT (level, outcome, moves) DO UPDATE SET runs = runs + excluded.runs",
+                        [(*key, n) for key, n in moves.items()]
+                    )
+            finally:
+                db.close()
+
+    def query(self, sql, params=()):
+        # Reads never wait for a batch being written (WAL) and never write themselves
+        if not os.path.exists(self.path):
+            return []
+        db = self.connect()
+        try:
+            return db.execute(sql, params).fetchall()
+        finally:
+            db.close()
+
+    def outcomes_by_level(self):
+        # {level: Counter of outcome -> runs}
+        table = {}
+        for level, outcome, runs in self.query("SELECT level, outcome, runs FROM outcome_counts ORDER BY level"):
+            table.setdefault(level, Counter())[OUTCOMES[outcome]] = runs
+        return table
+
+    def median_moves(self, outcome=ESCAPED):
+        # {level: median moves of the runs that ended in outcome}
+        histograms = {}
+        for level, moves, runs in self.query(
+            "SELECT level, moves, runs FROM move_counts WHERE outcome = ? ORDER BY level, moves",
+            (OUTCOMES.index(outcome),)
+        ):
+            histograms.setdefault(level, []).append((moves, runs))
+        return {level: histogram_median(histogram) for level, histogram in histograms.items()}
+
+
+def histogram_median(histogram):
+    # Lower median of sorted (value, count) pairs
+    middle = (sum(n for _, n in histogram) - 1) // 2
+    for value, n in histogram:
+        if middle < n:
+            return value
+        middle -= n
+    return None
+
+
+def format_table(stats):
+    # The stats screen text: per level, runs, how they ended and median moves to escape
+    outcomes = stats.outcomes_by_level()
+    medians = stats.median_moves()
+    lines = [f"{'level':>5} {'runs':>7} {'escaped':>8} {'spikes':>7} {'turret':>7} {'duck':>6} {'moves':>6}"]
+    for level, counts in sorted(outcomes.items()):
+        total = sum(counts.values())
+        median = medians.get(level)
+        lines.append(
+            f"{level:>5} {total:>7} " + " ".join(
+                f"{counts[outcome] / total:>{width}.0%}"
+                for outcome, width in zip(OUTCOMES[1:], (8, 7, 7, 6))
+            ) + f" {median if median is not None else '-':>6}"
+        )
+    return "\n".join(lines)
+
+
+def random_runs(count, levels=19, seed=0):
+    # Synthetic runs, for trying the queries on a big database
+    rng = random.Random(seed)
+    now = time.time()
+    for i in range(count):
+        level = rng.randint(1, levels)
+        outcome = rng.choice(OUTCOMES[1:])
+        yield Run(
+            now + i, level, rng.randrange(2**32), 6 + (level - 1) // 3, rng.randint(1, 60),
+            rng.uniform(1, 30), outcome, None if outcome == ESCAPED else (rng.randrange(6), rng.randrange(6)),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the run statistics the game records.")
+    parser.add_argument("path", nargs="?", default=STATS_FILE)
+    parser.add_argument("--fill", type=int, metavar="N", help="first add N synthetic runs")
+    args = parser.parse_args()
+
+    stats = RunStats(args.path)
+    if args.fill:
+        start = time.perf_counter()
+        batch = []
+        for run in random_runs(args.fill):
+            batch.append(run)
+            if len(batch) == 10000:
+                stats.write(batch)
+                batch = []
+        stats.write(batch)
+        print(f"Added {args.fill} runs in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    table = format_table(stats)
+    elapsed = time.perf_counter() - start
+    total = stats.query("SELECT SUM(runs) FROM outcome_counts")[0][0] or 0
+    print(table)
+    print(f"{total} runs, summary queried in {elapsed * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
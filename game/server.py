@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import time
+from collections import deque
+
+from controls import LOOKAHEAD
+from engine import GameState
+from levelgen import load_calibration
+from levelpack import encode_entry
+from profiler import percentile
+from protocol import (
+    CLOSE, ERROR, FRAME, HOST, MAX_PAYLOAD, MOVE, NEW, PORT, STATS, START, STATS_REPLY, TICK, WATCH,
+    MOVE_COMMAND, NEW_SESSION, NO_SEED, SERVER_STATS, SESSION, TICK_HEADER, encode_diff, frame,
+)
+from replay import COMMANDS
+
+TICK_INTERVAL = 1 / 30  # s
+TICK_HISTORY = 1000  # Tick durations kept for STATS
+HIGH_WATER = 256 * 1024  # Unsent bytes at which a client counts as slow
+MAX_STALL = 150  # Ticks a client may stay slow before it is dropped
+MAX_LEVEL = 300  # Grid 105: about 8 ms and 160 KiB to generate
+MAX_OWNED = 256  # Sessions one connection may own, including ones still generating
+MAX_SESSIONS = 20000  # Sessions across all connections
+
+
+class Session:
+    def __init__(self, session_id, state, owner):
+        self.id = session_id
+        self.state = state
+        self.owner = owner
+        self.pending = deque()
+        self.watchers = set()
+        self.destroyed = []  # Turret positions, in order
+
+
+class Connection:
+    # One client socket. Sessions that change are only marked dirty; once a
+    # tick, flush() sends one TICK frame with the latest state of each of
+    # them. While the socket's send buffer is over HIGH_WATER nothing is
+    # written and later changes fold into the same pending diffs, so a slow
+    # client costs no memory per tick; one slow for MAX_STALL ticks is cut.
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.watching = set()
+        self.owned = set()
+        self.starting = 0  # NEWs whose levels are still being generated
+        self.dirty = set()
+        self.sent = {}  # Session id -> destroyed turrets this client has been sent
+        self.stalled = 0
+
+    async def serve(self):
+        try:
+            while True:
+                length, kind = FRAME.unpack(await self.reader.readexactly(FRAME.size))
+                if length > MAX_PAYLOAD:
+                    break
+                payload = await self.reader.readexactly(length) if length else b""
+                self.server.handle(self, kind, payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.server.disconnect(self)
+
+    def send(self, kind, payload=b""):
+        self.writer.write(frame(kind, payload))
+
+    def flush(self, tick):
+        if not self.dirty:
+            return
+        transport = self.writer.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > HIGH_WATER:
+            self.stalled += 1
+            if self.stalled > MAX_STALL:
+                transport.abort()
+            return
+        self.stalled = 0
+        diffs = []
+        for session_id in self.dirty:
+            session = self.server.sessions.get(session_id)
+            if session is None:
+                continue
+            sent = self.sent.get(session_id, 0)
+            diffs.append(encode_diff(session_id, session.state, session.destroyed[sent:]))
+            self.sent[session_id] = len(session.destroyed)
+        self.dirty.clear()
+        self.send(TICK, TICK_HEADER.pack(tick, len(diffs)) + b"".join(diffs))
+
+
+class GameServer:
+    # Any number of independent GameStates on one event loop. Moves are
+    # queued as they arrive (at most LOOKAHEAD per session, like the Tk
+    # input buffer) and applied on a fixed tick, one per session per tick.
+    def __init__(self, tick_interval=TICK_INTERVAL):
+        self.tick_interval = tick_interval
+        self.sessions = {}
+        self.connections = set()
+        self.ready = set()
+        self.next_id = 1
+        self.starting = 0
+        self.tasks = set()  # The loop keeps only weak references to tasks
+        self.tick_count = 0
+        self.tick_times = deque(maxlen=TICK_HISTORY)
+
+    async def connect(self, reader, writer):
+        connection = Connection(self, reader, writer)
+        self.connections.add(connection)
+        await connection.serve()
+
+    def disconnect(self, connection):
+        self.connections.discard(connection)
+        for session_id in list(connection.owned):
+            self.end_session(self.sessions[session_id])
+        for session_id in connection.watching:
+            session = self.sessions.get(session_id)
+            if session:
+                session.watchers.discard(connection)
+        connection.writer.close()
+
+    def handle(self, connection, kind, payload):
+        try:
+            if kind == NEW:
+                level, seed = NEW_SESSION.unpack(payload)
+                if not 1 <= level <= MAX_LEVEL:
+                    raise ValueError(f"level must be 1-{MAX_LEVEL}")
+                if len(connection.owned) + connection.starting >= MAX_OWNED:
+                    raise ValueError(f"at most {MAX_OWNED} sessions per connection")
+                if len(self.sessions) + self.starting >= MAX_SESSIONS:
+                    raise ValueError("server full")
+                connection.starting += 1
+                self.starting += 1
+                task = asyncio.get_running_loop().create_task(
+                    self.start_session(connection, level, None if seed == NO_SEED else seed)
+                )
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+            elif kind == MOVE:
+                session_id, command = MOVE_COMMAND.unpack(payload)
+                session = self.sessions.get(session_id)
+                if session is None or session.owner is not connection or command >= len(COMMANDS):
+                    raise ValueError("bad move")
+                if len(session.pending) < LOOKAHEAD:
+                    session.pending.append(COMMANDS[command])
+                    self.ready.add(session)
+            elif kind == WATCH:
+                session = self.sessions.get(SESSION.unpack(payload)[0])
+                if session is None:
+                    raise ValueError("no such session")
+                self.watch(connection, session)
+            elif kind == CLOSE:
+                session = self.sessions.get(SESSION.unpack(payload)[0])
+                if session is not None and session.owner is connection:
+                    self.end_session(session)
+            elif kind == STATS:
+                ticks = list(self.tick_times)
+                connection.send(STATS_REPLY, SERVER_STATS.pack(
+                    time.process_time(), len(self.sessions),
+                    percentile(ticks, 0.5) * 1e3, percentile(ticks, 0.99) * 1e3,
+                ))
+            else:
+                raise ValueError(f"unknown message {kind}")
+        except Exception as e:  # struct.error, ValueError: tell the client, keep serving
+            connection.send(ERROR, str(e).encode())
+
+    async def start_session(self, connection, level, seed):
+        # Levels are generated on a worker thread so a big one doesn't hold up the tick
+        try:
+            state = await asyncio.get_running_loop().run_in_executor(None, GameState, level, seed)
+        except Exception as e:  # The client is waiting for a START, so it gets the reason instead
+            if connection in self.connections:
+                connection.send(ERROR, f"level {level} failed: {e}".encode())
+            return
+        finally:
+            connection.starting -= 1
+            self.starting -= 1
+        if connection not in self.connections:
+            return
+        session = Session(self.next_id, state, connection)
+        self.next_id += 1
+        self.sessions[session.id] = session
+        connection.owned.add(session.id)
+        self.watch(connection, session)
+
+    def watch(self, connection, session):
+        # START carries the level as it is now, so only later turrets go in diffs
+        state = session.state
+        session.watchers.add(connection)
+        connection.watching.add(session.id)
+        connection.sent[session.id] = len(session.destroyed)
+        connection.send(START, SESSION.pack(session.id) + encode_entry(state.level, state.seed, state.layout()))
+
+    def end_session(self, session):
+        del self.sessions[session.id]
+        self.ready.discard(session)
+        session.owner.owned.discard(session.id)
+        for connection in session.watchers:
+            connection.watching.discard(session.id)
+            connection.dirty.discard(session.id)
+            connection.sent.pop(session.id, None)
+
+    def tick(self):
+        began = time.perf_counter()
+        ready, self.ready = self.ready, set()
+        for session in ready:
+            command = session.pending.popleft()
+            state = session.state
+            if state.running:
+                result = state.step(command)
+                if result.destroyed_turret:
+                    session.destroyed.append(result.destroyed_turret[0])
+            for connection in session.watchers:
+                connection.dirty.add(session.id)
+            if session.pending:
+                self.ready.add(session)
+        for connection in self.connections:
+            connection.flush(self.tick_count)
+        self.tick_count += 1
+        self.tick_times.append(time.perf_counter() - began)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        due = loop.time()
+        while True:
+            self.tick()
+            due += self.tick_interval
+            # An overloaded server skips ticks instead of queueing them
+            due = max(due, loop.time())
+            await asyncio.sleep(due - loop.time())
+
+
+async def serve(host=HOST, port=PORT, tick_interval=TICK_INTERVAL):
+    game_server = GameServer(tick_interval)
+    server = await asyncio.start_server(game_server.connect, host, port)
+    async with server:
+        await asyncio.gather(server.serve_forever(), game_server.run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host Escape from Duck sessions over TCP.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--tick", type=float, default=TICK_INTERVAL * 1000, help="tick interval in ms")
+    args = parser.parse_args()
+    load_calibration()  # Same levels as escapefd.py, so server runs replay locally
+    try:
+        asyncio.run(serve(args.host, args.port, args.tick / 1000))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import argparse
+import os
+from array import array
+import time
+from collections import Counter, OrderedDict, namedtuple
+from multiprocessing import Pool
+
+from engine import GameState, MOVES
+from hazards import HazardMap
+from levelgen import CALIBRATION, load_calibration, set_calibration
+from pathfinding import DistanceField, NEIGHBOURS
+from replay import COMMANDS
+
+TABLE_SIZE = 500000  # States remembered by the transposition table
+FIELD_CACHE = 4096  # Duck distance fields kept, one per (turrets left, player cell)
+FIELD_CELLS = 4000000  # ... and at most this many cells across them (about 32 MB of list slots)
+BOARD_CACHE = 256  # Hazard layouts kept, one per set of destroyed turrets
+MAX_STATES = 2000000  # States searched before giving up with UNKNOWN
+
+# Results
+WON = "won"
+LOST = "lost"
+UNKNOWN = "unknown"
+
+# line: the shortest winning moves as a command string; difficulty: how much
+# longer it is than the straight walk to the exit (1.0 = no detour)
+Solution = namedtuple("Solution", "result line states evictions difficulty")
+
+
+class BoundedCache:
+    # LRU mapping that forgets its oldest entry once it holds `capacity`
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return True
+        return False
+
+
+class Board:
+    # Hazards and the duck's obstacle template with some turrets destroyed
+    def __init__(self, layout, mask):
+        n = layout.grid_size
+        turrets = [turret for i, turret in enumerate(layout.turrets) if not mask >> i & 1]
+        self.hazards = HazardMap(n, layout.spikes, turrets)
+        self.field = DistanceField(n, list(layout.spikes) + [pos for pos, _ in turrets])
+
+
+class Solver:
+    # Breadth-first search over (player, ducks, destroyed turrets) with the
+    # ducks' deterministic replies, so the first win found is a shortest
+    # line. A state is one int: the destroyed-turret bitmask and every
+    # position in mixed radix of the cell count. The transposition table
+    # is bounded; a state it forgot may be searched again, which costs time
+    # but never correctness, and a search whose frontier runs dry has
+    # still expanded every reachable state, so LOST is a proof. Lines are
+    # not carried along: each depth keeps, per state, its parent's index in
+    # the depth before and the move's code, five bytes a state, and the
+    # winning line is read back through them.
+    def __init__(self, layout, table_size=TABLE_SIZE, max_states=MAX_STATES):
+        self.layout = layout
+        self.n = layout.grid_size
+        self.cells = self.n * self.n
+        self.duck_count = 1 + len(layout.extra_ducks)
+        self.spikes = set(layout.spikes)
+        self.turret_index = {pos: i for i, (pos, _) in enumerate(layout.turrets)}
+        self.exit = tuple(layout.exit)
+        self.table = BoundedCache(table_size)
+        self.boards = BoundedCache(BOARD_CACHE)
+        self.fields = BoundedCache(max(1, min(FIELD_CACHE, FIELD_CELLS // (self.n + 2) ** 2)))
+        self.max_states = max_states
+
+    def encode(self, player, ducks, mask):
+        key = mask
+        for x, y in ducks:
+            key = key * self.cells + y * self.n + x
+        return key * self.cells + player[1] * self.n + player[0]
+
+    def decode(self, key):
+        key, cell = divmod(key, self.cells)
+        player = (cell % self.n, cell // self.n)
+        ducks = []
+        for _ in range(self.duck_count):
+            key, cell = divmod(key, self.cells)
+            ducks.append((cell % self.n, cell // self.n))
+        ducks.reverse()
+        return player, ducks, key
+
+    def board(self, mask):
+        board = self.boards.get(mask)
+        if board is None:
+            board = Board(self.layout, mask)
+            self.boards.put(mask, board)
+        return board
+
+    def field(self, mask, player):
+        # Distances to the player over the obstacles left standing
+        dist = self.fields.get((mask, player))
+        if dist is None:
+            field = self.board(mask).field
+            field.set_target(*player)
+            dist = field.fill()
+            self.fields.put((mask, player), dist)
+        return dist
+
+    def duck_moves(self, mask, player, ducks):
+        # GameState.move_ducks on a cached field
+        field = self.board(mask).field
+        dist = self.field(mask, player)
+
+        def steps(x, y):
+            i = field.index(x, y)
+            d = dist[i]
+            if d <= 0:
+                return []
+            return [move for move, off in zip(NEIGHBOURS, field.offsets) if dist[i + off] == d - 1]
+        if len(ducks) == 1:
+            x, y = ducks[0]
+            moves = steps(x, y)[:1]
+            mx, my = moves[0] if moves else (0, 0)
+            return [(x + mx, y + my)]
+        order = []
+        for i, (x, y) in enumerate(ducks):
+            d = dist[field.index(x, y)]
+            order.append((d < 0, max(d, 0), i))
+        order.sort()
+        occupied = set(ducks)
+        moved = list(ducks)
+        for _, _, i in order:
+            x, y = ducks[i]
+            for mx, my in steps(x, y):
+                if (x + mx, y + my) not in occupied:
+                    occupied.discard((x, y))
+                    occupied.add((x + mx, y + my))
+                    moved[i] = (x + mx, y + my)
+                    break
+        return moved
+
+    def move(self, key, command):
+        # The state after command, WON, or None when the player dies
+        player, ducks, mask = self.decode(key)
+        dx, dy = MOVES[command]
+        nx, ny = player[0] + dx, player[1] + dy
+        if 0 <= nx < self.n and 0 <= ny < self.n:
+            player = (nx, ny)
+        if player in self.spikes:
+            return None
+        ducks = self.duck_moves(mask, player, ducks)
+        turret = self.turret_index.get(player)
+        if turret is not None and not mask >> turret & 1:
+            mask |= 1 << turret
+        if self.board(mask).hazards.in_laser(*player) or player in ducks:
+            return None
+        if player == self.exit:
+            return WON
+        return self.encode(player, ducks, mask)
+
+    def solve(self):
+        layout = self.layout
+        start = self.encode(tuple(layout.player), [tuple(layout.duck)] + [tuple(d) for d in layout.extra_ducks], 0)
+        self.table.put(start, True)
+        frontier = [start]
+        depths = []  # (parent indices, move codes) of each depth's states
+        states = 1
+        while frontier:
+            keys = []
+            parents = array("I")
+            codes = bytearray()
+            for index, key in enumerate(frontier):
+                for code, command in enumerate(COMMANDS):
+                    result = self.move(key, command)
+                    if result is WON:
+                        return self.solution(WON, self.line(depths, index, code), states)
+                    if result is None or result in self.table:
+                        continue
+                    self.table.put(result, True)
+                    states += 1
+                    if states > self.max_states:
+                        return self.solution(UNKNOWN, "", states)
+                    keys.append(result)
+                    parents.append(index)
+                    codes.append(code)
+            depths.append((parents, codes))
+            frontier = keys
+        return self.solution(LOST, "", states)
+
+    def line(self, depths, index, code):
+        # The moves to state `index` of the deepest depth, then `code`
+        codes = [code]
+        for parents, depth_codes in reversed(depths):
+            codes.append(depth_codes[index])
+            index = parents[index]
+        return "".join(COMMANDS[c] for c in reversed(codes))
+
+    def solution(self, result, line, states):
+        px, py = self.layout.player
+        ex, ey = self.exit
+        difficulty = len(line) / max(1, abs(ex - px) + abs(ey - py)) if result == WON else None
+        return Solution(result, line, states, self.table.evictions, difficulty)
+
+
+def solve_level(level, seed, table_size=TABLE_SIZE, max_states=MAX_STATES):
+    # The level GameState(level, seed) plays
+    return Solver(GameState(level, seed).layout(), table_size, max_states).solve()
+
+
+def _solve_task(args):
+    level, seed, table_size, max_states = args
+    return level, seed, solve_level(level, seed, table_size, max_states)
+
+
+def solve_levels(levels, seeds, processes=None, table_size=TABLE_SIZE, max_states=MAX_STATES):
+    # Yields (level, seed, Solution) for every pair, in completion order
+    tasks = [(level, seed, table_size, max_states) for level in levels for seed in seeds]
+    if processes == 1:
+        yield from map(_solve_task, tasks)
+        return
+    with Pool(processes, set_calibration, (dict(CALIBRATION),)) as pool:
+        yield from pool.imap_unordered(_solve_task, tasks)
+
+
+def parse_levels(text):
+    # "5" or "1-19"
+    first, _, last = text.partition("-")
+    return range(int(first), int(last or first) + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve Escape from Duck levels and score their difficulty.")
+    parser.add_argument("levels", nargs="?", default="1-19", help="level or range, e.g. 1-19")
+    parser.add_argument("-n", "--seeds", type=int, default=20, help="seeds per level")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="first seed")
+    parser.add_argument("-j", "--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--table-size", type=int, default=TABLE_SIZE)
+    parser.add_argument("--max-states", type=int, default=MAX_STATES)
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every level's line")
+    args = parser.parse_args()
+    load_calibration()  # Solve the levels the game plays
+
+    levels = parse_levels(args.levels)
+    seeds = range(args.seed, args.seed + args.seeds)
+    start = time.perf_counter()
+    results = {level: [] for level in levels}
+    for level, seed, solution in solve_levels(levels, seeds, args.processes, args.table_size, args.max_states):
+        results[level].append(solution)
+        if args.verbose:
+            print(f"level {level} seed {seed}: {solution.result} {solution.line} ({solution.states} states)")
+    print(f"{'level':>5} {'won':>5} {'lost':>5} {'unknown':>7} {'moves':>6} {'difficulty':>10} {'states':>9}")
+    for level, solutions in results.items():
+        counts = Counter(s.result for s in solutions)
+        won = [s for s in solutions if s.result == WON]
+        moves = sum(len(s.line) for s in won) / len(won) if won else 0
+        difficulty = sum(s.difficulty for s in won) / len(won) if won else 0
+        states = sum(s.states for s in solutions) / len(solutions)
+        print(f"{level:>5} {counts[WON]:>5} {counts[LOST]:>5} {counts[UNKNOWN]:>7} "
+              f"{moves:6.1f} {difficulty:10.2f} {states:9.0f}")
+    print(f"{len(levels) * len(seeds)} levels in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import atexit
+import json
+import os
+import pickle
+import threading
+import time
+
+SAVE_VERSION = 1
+DEBOUNCE = 0.25  # s of quiet before pending changes are written
+COMPACT_EVERY = 50  # Journal entries folded into the snapshot at a time
+
+
+class SaveStore:
+    # Progress is kept as a JSON snapshot plus an append-only journal of
+    # newer states, one JSON line each. save() only records the latest state;
+    # a background thread writes it once saves have been quiet for DEBOUNCE
+    # seconds, so bursts (achievement + win + death) become one append and
+    # the UI thread never touches the disk. Every COMPACT_EVERY entries the
+    # state is written to a temp file and renamed over the snapshot, so a
+    # crash leaves either the old or the new file, never a truncated one; a
+    # journal line torn by a crash is cut off on the next load.
+    def __init__(self, path, legacy_path=None, debounce=DEBOUNCE, compact_every=COMPACT_EVERY):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.legacy_path = legacy_path
+        self.debounce = debounce
+        self.compact_every = compact_every
+        self.entries = 0
+        self.pending = None
+        self.due = 0.0
+        self.closed = False
+        self.generation = 0  # Bumped by clear(), so writes taken before it are dropped
+        self.cond = threading.Condition()
+        self.io_lock = threading.Lock()
+        self.thread = None
+        atexit.register(self.close)
+
+    def load(self):
+        data = self.read_snapshot()
+        if data is None and self.legacy_path and os.path.exists(self.legacy_path):
+            try:
+                with open(self.legacy_path, "rb") as f:
+                    data = pickle.load(f)
+            except Exception:
+                data = None
+        data = dict(data or {})
+        self.entries = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r+b") as f:
+                good = 0
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError
+                        data.update(json.loads(line))
+                    except ValueError:
+                        # Torn last write: cut it so later appends start on a fresh line
+                        f.truncate(good)
+                        break
+                    good += len(line)
+                    self.entries += 1
+        return data
+
+    def read_snapshot(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if snapshot.get("version", 0) > SAVE_VERSION:
+            return None
+        return snapshot.get("data")
+
+    def save(self, data):
+        with self.cond:
+            self.pending = dict(data)
+            self.due = time.monotonic() + self.debounce
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="save-writer", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def flush(self):
+        with self.cond:
+            data, self.pending = self.pending, None
+            generation = self.generation
+        if data is not None:
+            self.write(data, generation)
+
+    def close(self):
+        # The writer finishes any state it already took before the newest is written
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.flush()
+
+    def clear(self):
+        with self.cond:
+            self.pending = None
+            self.generation += 1
+        with self.io_lock:
+            for path in (self.path, self.journal_path, self.legacy_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+            self.entries = 0
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.closed and (self.pending is None or time.monotonic() < self.due):
+                    timeout = self.due - time.monotonic() if self.pending is not None else None
+                    self.cond.wait(timeout)
+                if self.closed:
+                    return
+                data, self.pending = self.pending, None
+                generation = self.generation
+            self.write(data, generation)
+
+    def write(self, data, generation=None):
+        with self.io_lock:
+            if generation is not None and generation != self.generation:
+                return  # Taken before a clear()
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(data, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.entries += 1
+            if self.entries >= self.compact_every:
+                self.compact(data)
+
+    def compact(self, data):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": SAVE_VERSION, "data": data}, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        # The snapshot now holds everything the journal did
+        open(self.journal_path, "w").close()
+        self.entries = 0
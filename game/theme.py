@@ -0,0 +1,16 @@
+CELL_SIZE = 60
+
+# Modern color palette
+BG_DARK = "#181c24"
+BG_PANEL = "#232a34"
+FG_LIGHT = "#e0e0e0"
+ACCENT = "#43e97b"
+ACCENT2 = "#4caf50"
+DANGER = "#f44336"
+TURRET = "#888"
+SPIKE = "#bdb76b"
+LASER = "#ffe066"
+PLAYER = "#2196f3"
+EXIT = "#43e97b"
+BORDER = "#2c3440"
+GOLD = "#ffd700"
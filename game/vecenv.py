@@ -0,0 +1,256 @@
+import argparse
+import random
+import time
+
+import numpy as np
+
+from engine import GameState, MOVES, RUNNING, ESCAPED, SPIKES, TURRET, DUCK
+from levelgen import DIRECTIONS, duck_count_for_level, generate_level, grid_size_for_level, load_calibration
+from pathfinding import NEIGHBOURS
+
+ACTIONS = ['w', 'a', 's', 'd', None]  # Action codes; None (4) stands still
+OUTCOMES = [RUNNING, ESCAPED, SPIKES, TURRET, DUCK]  # Outcome codes, same order as replay files
+BANK_SIZE = 4096  # Distinct layouts episodes are drawn from
+NO_TURRET = -1
+
+ACTION_X = np.array([MOVES.get(a, (0, 0))[0] for a in ACTIONS])
+ACTION_Y = np.array([MOVES.get(a, (0, 0))[1] for a in ACTIONS])
+STAY = len(NEIGHBOURS)
+STEP_X = np.array([dx for dx, _ in NEIGHBOURS] + [0])
+STEP_Y = np.array([dy for _, dy in NEIGHBOURS] + [0])
+UP, DOWN, LEFT, RIGHT = (DIRECTIONS.index(d) for d in ('up', 'down', 'left', 'right'))
+CODE = {outcome: code for code, outcome in enumerate(OUTCOMES)}
+
+ONE = np.uint64(1)
+ROW_BITS = 64
+
+# Per-episode arrays a reset copies from the bank. Spikes and free cells
+# are one 64-bit mask per grid row, padded by an empty row and bit on each
+# side so neighbours never index out of range; turrets are [y, x] grids
+LAYOUT_FIELDS = ("seed", "px", "py", "dx", "dy", "ex", "ey", "spikes", "free", "turrets", "left", "right", "up", "down")
+
+
+class LayoutBank:
+    # Layouts for seeds seed..seed+size-1, generated once by the reference
+    # generator and stored as arrays, so resetting an episode is a row copy
+    def __init__(self, level, seed=0, size=BANK_SIZE):
+        g = grid_size_for_level(level)
+        pad = g + 2
+        self.seed = np.arange(seed, seed + size, dtype=np.int64)
+        for name in ("px", "py", "dx", "dy", "ex", "ey"):
+            setattr(self, name, np.zeros(size, np.int64))
+        self.spikes = np.zeros((size, pad), np.uint64)
+        self.free = np.zeros((size, pad), np.uint64)
+        self.turrets = np.full((size, g, g), NO_TURRET, np.int8)
+        for i, layout_seed in enumerate(range(seed, seed + size)):
+            # The same draws GameState(level, seed) makes
+            layout = generate_level(level, random.Random(layout_seed), g)
+            self.px[i], self.py[i] = layout.player
+            self.dx[i], self.dy[i] = layout.duck
+            self.ex[i], self.ey[i] = layout.exit
+            spikes = [0] * pad
+            free = [0] + [((1 << g) - 1) << 1] * g + [0]
+            for x, y in layout.spikes:
+                spikes[y + 1] |= 1 << (x + 1)
+                free[y + 1] &= ~(1 << (x + 1))
+            for (x, y), direction in layout.turrets:
+                self.turrets[i, y, x] = DIRECTIONS.index(direction)
+                free[y + 1] &= ~(1 << (x + 1))
+            self.spikes[i] = spikes
+            self.free[i] = free
+        self.left, self.right, self.up, self.down = laser_lines(self.turrets)
+
+
+def laser_lines(turrets):
+    # hazards.HazardMap's innermost turret per row/column direction, for a stack of [y, x] grids
+    g = turrets.shape[-1]
+    line = np.arange(g)
+    return (
+        np.where(turrets == LEFT, line, -1).max(axis=2),  # Row y is lasered where x < left
+        np.where(turrets == RIGHT, line, g).min(axis=2),  # ... or x > right
+        np.where(turrets == UP, line[:, None], -1).max(axis=1),  # Column x is lasered where y < up
+        np.where(turrets == DOWN, line[:, None], g).min(axis=1),  # ... or y > down
+    )
+
+
+class BatchEnv:
+    # N single-duck games of one level advanced together. Every rule of
+    # GameState.step is an array operation over the running games. The duck
+    # BFS grows all their fields one layer at a time on the row masks, a
+    # layer being a few shifts and ORs per row, and drops a game as soon as
+    # its duck is reached, so a step costs about (duck distance) x N x rows
+    # word operations.
+    def __init__(self, envs, level=1, seed=0, bank_size=BANK_SIZE):
+        if duck_count_for_level(level) > 1:
+            raise ValueError("BatchEnv only runs single-duck levels")
+        if grid_size_for_level(level) + 2 > ROW_BITS:
+            raise ValueError(f"BatchEnv grids are at most {ROW_BITS - 2} cells wide")
+        self.envs = envs
+        self.level = level
+        self.grid_size = grid_size_for_level(level)
+        self.bank = LayoutBank(level, seed, bank_size)
+        self.next_layout = 0
+        for name in LAYOUT_FIELDS:
+            bank = getattr(self.bank, name)
+            setattr(self, name, np.zeros((envs,) + bank.shape[1:], bank.dtype))
+        self.outcome = np.zeros(envs, np.int8)
+        self.moves = np.zeros(envs, np.int64)
+        self.reset()
+
+    def reset(self, mask=None):
+        # Start new episodes in all games, or in those where mask is set
+        envs = np.arange(self.envs) if mask is None else np.flatnonzero(mask)
+        picks = (self.next_layout + np.arange(len(envs))) % len(self.bank.seed)
+        self.next_layout = (self.next_layout + len(envs)) % len(self.bank.seed)
+        for name in LAYOUT_FIELDS:
+            getattr(self, name)[envs] = getattr(self.bank, name)[picks]
+        self.outcome[envs] = 0
+        self.moves[envs] = 0
+        return envs
+
+    def step(self, actions):
+        # actions: one ACTIONS code per game; finished games are left alone
+        actions = np.asarray(actions)
+        run = np.flatnonzero(self.outcome == 0)
+        g = self.grid_size
+        nx = self.px[run] + ACTION_X[actions[run]]
+        ny = self.py[run] + ACTION_Y[actions[run]]
+        inside = (nx >= 0) & (nx < g) & (ny >= 0) & (ny < g)
+        self.px[run] = np.where(inside, nx, self.px[run])
+        self.py[run] = np.where(inside, ny, self.py[run])
+        choice = self.duck_steps(run)
+        self.dx[run] += STEP_X[choice]
+        self.dy[run] += STEP_Y[choice]
+        self.moves[run] += 1
+        self.check_status(run)
+        return self.outcome
+
+    def duck_steps(self, run):
+        # Index into NEIGHBOURS of each duck's move, STAY when it has none;
+        # the same choice as DistanceField.next_step
+        rows = np.arange(len(run))
+        free = self.free[run]
+        tx, ty = self.px[run] + 1, self.py[run] + 1
+        dx, dy = self.dx[run] + 1, self.dy[run] + 1
+        choice = np.full(len(run), STAY)
+        # A player on a spike or turret base blocks the whole field
+        active = np.flatnonzero(
+            (free[rows, ty] >> tx.astype(np.uint64)) & (free[rows, dy] >> dx.astype(np.uint64)) & ONE
+            & ((tx != dx) | (ty != dy))
+        )
+        frontier = np.zeros((len(active), free.shape[1]), np.uint64)
+        frontier[np.arange(len(active)), ty[active]] = ONE << tx[active].astype(np.uint64)
+        unseen = free[active] & ~frontier
+        dx, dy = dx[active], dy[active]
+        live = len(active)
+        while live:
+            layer = (frontier << ONE) | (frontier >> ONE)
+            layer[:, 1:] |= frontier[:, :-1]
+            layer[:, :-1] |= frontier[:, 1:]
+            layer &= unseen
+            unseen ^= layer
+            hit = ((layer[np.arange(len(active)), dy] >> dx.astype(np.uint64)) & ONE).astype(bool)
+            if hit.any():
+                # The duck's neighbours in the previous layer are the ones one
+                # step closer; argmax takes the first in NEIGHBOURS order
+                h = np.flatnonzero(hit)
+                near = np.stack([
+                    (frontier[h, dy[h] + my] >> (dx[h] + mx).astype(np.uint64)) & ONE
+                    for mx, my in NEIGHBOURS
+                ], axis=1)
+                choice[active[h]] = near.argmax(axis=1)
+                layer[h] = 0
+            frontier = layer
+            keep = layer.any(axis=1)
+            live = np.count_nonzero(keep)
+            # Finished games are dropped once they make up half the arrays
+            if live < len(active) // 2:
+                active, frontier, unseen, dx, dy = active[keep], frontier[keep], unseen[keep], dx[keep], dy[keep]
+        return choice
+
+    def in_laser(self, envs, x, y):
+        return (
+            (x < self.left[envs, y]) | (x > self.right[envs, y])
+            | (y < self.up[envs, x]) | (y > self.down[envs, x])
+        )
+
+    def check_status(self, run):
+        # Same order as GameState.check_status: spikes, turret destruction,
+        # lasers, duck, exit
+        x, y = self.px[run], self.py[run]
+        bit = ONE << (x + 1).astype(np.uint64)
+        spike = (self.spikes[run, y + 1] & bit).astype(bool)
+        base = ~spike & (self.turrets[run, y, x] != NO_TURRET)
+        if base.any():
+            envs = run[base]
+            self.turrets[envs, y[base], x[base]] = NO_TURRET
+            self.free[envs, y[base] + 1] |= bit[base]
+            self.left[envs], self.right[envs], self.up[envs], self.down[envs] = laser_lines(self.turrets[envs])
+        laser = ~spike & self.in_laser(run, x, y)
+        caught = ~spike & ~laser & (x == self.dx[run]) & (y == self.dy[run])
+        escaped = ~spike & ~laser & ~caught & (x == self.ex[run]) & (y == self.ey[run])
+        outcome = np.zeros(len(run), np.int8)
+        outcome[spike] = CODE[SPIKES]
+        outcome[laser] = CODE[TURRET]
+        outcome[caught] = CODE[DUCK]
+        outcome[escaped] = CODE[ESCAPED]
+        self.outcome[run] = outcome
+
+
+def check_parity(envs=256, steps=100, level=1, seed=0):
+    # Play random actions in a BatchEnv and in one GameState per game, and
+    # return every step where the two disagree
+    env = BatchEnv(envs, level, seed, bank_size=envs)
+    states = [GameState(level, int(s)) for s in env.seed]
+    rng = np.random.default_rng(seed)
+    mismatches = []
+    for t in range(steps):
+        actions = rng.integers(0, len(ACTIONS), envs)
+        env.step(actions)
+        for e, state in enumerate(states):
+            state.step(ACTIONS[actions[e]])
+            turrets = {(x, y) for y, x in zip(*np.nonzero(env.turrets[e] != NO_TURRET))}
+            ours = (
+                OUTCOMES[env.outcome[e]], int(env.moves[e]), [int(env.px[e]), int(env.py[e])],
+                [int(env.dx[e]), int(env.dy[e])], turrets,
+            )
+            theirs = (state.outcome, state.moves, state.player_position, state.duck_position, set(state.turret_bases))
+            if ours != theirs:
+                mismatches.append((level, state.seed, t, ours, theirs))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched Escape from Duck games on NumPy arrays.")
+    parser.add_argument("-n", "--envs", type=int, default=4096)
+    parser.add_argument("-l", "--level", type=int, default=1)
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--check", action="store_true", help="compare against GameState on every single-duck level")
+    args = parser.parse_args()
+    load_calibration()
+
+    if args.check:
+        failed = 0
+        for level in range(1, 20):
+            mismatches = check_parity(256, 100, level, args.seed)
+            failed += len(mismatches)
+            print(f"level {level:2}: {'ok' if not mismatches else f'{len(mismatches)} mismatches'}")
+            for level, seed, t, ours, theirs in mismatches[:3]:
+                print(f"  seed {seed} step {t}: batch {ours} != engine {theirs}")
+        raise SystemExit(1 if failed else 0)
+
+    env = BatchEnv(args.envs, args.level, args.seed)
+    rng = np.random.default_rng(args.seed)
+    start = time.perf_counter()
+    episodes = 0
+    for _ in range(args.steps):
+        outcome = env.step(rng.integers(0, len(ACTIONS), args.envs))
+        episodes += len(env.reset(outcome != 0))
+    elapsed = time.perf_counter() - start
+    print(f"{args.envs} games x {args.steps} steps at level {args.level} in {elapsed:.2f}s "
+          f"- {args.envs * args.steps / elapsed:.0f} steps/s, {episodes} episodes")
+
+
+if __name__ == "__main__":
+    main()